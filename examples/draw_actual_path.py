@@ -6,8 +6,6 @@ import pandas as pd
 from os.path import join, dirname, abspath, expanduser
 from ast import literal_eval as make_tuple
 import matplotlib.pyplot as plt
-from pyrieef.geometry.workspace import SignedDistanceWorkspaceMap
-from pyrieef.geometry.pixel_map import sdf
 
 ROOT_DIR = join(dirname(abspath(__file__)), '..')
 DATA_DIR = join(ROOT_DIR, 'data', 'experiments')
@@ -37,10 +35,7 @@ hr = HumanRollout(path_to_mogaze=DATASET_DIR)
 ws = HumoroWorkspace(hr, robot_model_file=robot_model_file)
 ws.initialize_workspace_from_humoro(segment=segment, objects=[])
 if args.m == 1:
-    meshgrid = ws.box.stacked_meshgrid(100)
-    sdf_map = np.asarray(SignedDistanceWorkspaceMap(ws)(meshgrid))
-    sdf_map = (sdf_map < 0).astype(float)
-    signed_dist_field = np.asarray(sdf(sdf_map))
+    signed_dist_field = ws.get_sdf_raster(nb_points=100).field
     signed_dist_field = np.flip(signed_dist_field, axis=0)
     signed_dist_field = np.interp(signed_dist_field, (signed_dist_field.min(), signed_dist_field.max()), (0, max(ws.box.dim)))
 
@@ -0,0 +1,58 @@
+import sys
+import argparse
+import timeit
+import numpy as np
+from os.path import join, dirname, abspath
+
+ROOT_DIR = join(dirname(abspath(__file__)), '..')
+sys.path.append(ROOT_DIR)
+
+from pyrieef.geometry.workspace import Circle, Box
+from lgp.geometry.kinematics import EnvBox
+from lgp.geometry.sdf import ObstacleSDF
+
+
+parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                 description='Example run: python sdf_benchmark.py -o 20')
+parser.add_argument('-o', help='number of obstacles', type=int, default=20)
+parser.add_argument('-n', help='meshgrid resolution', type=int, default=100)
+parser.add_argument('-r', help='repeats', type=int, default=20)
+args = parser.parse_args()
+
+
+def loop_min_dist(obstacles, pt):
+    '''
+    Per obstacle loop of LGPWorkspace.min_dist before the signed distance engine
+    '''
+    d_m = np.full((pt.shape[1], pt.shape[2]), np.inf)
+    obj = None
+    for k, obst in obstacles.items():
+        d = obst.dist_from_border(pt)
+        closer_to_k = d < d_m
+        d_m = np.where(closer_to_k, d, d_m)
+        obj = np.where(closer_to_k, k, obj)
+    return d_m, obj
+
+
+box = EnvBox()
+np.random.seed(0)
+obstacles = {}
+for i in range(args.o):
+    origin = np.random.uniform(-box.dim / 2, box.dim / 2)
+    if i % 2:
+        obstacles['circle' + str(i)] = Circle(origin=origin, radius=np.random.uniform(0.2, 0.8))
+    else:
+        obstacles['box' + str(i)] = Box(origin=origin, dim=np.random.uniform(0.2, 0.8, 2))
+meshgrid = box.stacked_meshgrid(args.n)
+points = np.moveaxis(meshgrid, 0, -1)
+trajectories = np.random.uniform(-box.dim / 2, box.dim / 2, (50, 200, 2))
+
+d_loop, _ = loop_min_dist(obstacles, meshgrid)
+d_engine = ObstacleSDF(obstacles).signed_distance(points)
+print(f'Max abs difference on meshgrid: {np.abs(d_loop - d_engine).max()}')
+t_loop = timeit.timeit(lambda: loop_min_dist(obstacles, meshgrid), number=args.r) / args.r
+t_engine = timeit.timeit(lambda: ObstacleSDF(obstacles).closest(points), number=args.r) / args.r
+print(f'Meshgrid {args.n}x{args.n}, {args.o} obstacles: loop {t_loop * 1e3:.3f} ms, engine {t_engine * 1e3:.3f} ms, speedup {t_loop / t_engine:.1f}x')
+t_engine = timeit.timeit(lambda: ObstacleSDF(obstacles).closest(trajectories), number=args.r) / args.r
+t_gradient = timeit.timeit(lambda: ObstacleSDF(obstacles).gradient(trajectories), number=args.r) / args.r
+print(f'Trajectories {trajectories.shape}: distance {t_engine * 1e3:.3f} ms, gradient {t_gradient * 1e3:.3f} ms')
@@ -0,0 +1,64 @@
+import sys
+import argparse
+import logging
+import numpy as np
+from os.path import join, dirname, abspath, expanduser
+
+logging.basicConfig(level=logging.INFO)
+
+ROOT_DIR = join(dirname(abspath(__file__)), '..')
+DATA_DIR = join(ROOT_DIR, 'data', 'scenarios')
+MODEL_DIR = join(expanduser("~"), '.qibullet', '1.4.3')
+DATASET_DIR = join(ROOT_DIR, 'datasets', 'mogaze')
+sys.path.append(ROOT_DIR)
+
+from lgp.core.dynamic import HumoroDynamicLGP
+from lgp.experiment.pipeline import Experiment
+from lgp.geometry.trajectory import linear_interpolation_waypoints_trajectory
+
+
+parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+                                 description='Example run: python surrogate_ranking.py')
+parser.add_argument('-p', help='prediction', type=bool, default=False)
+args = parser.parse_args()
+
+test_segments = [
+    ('p5_1', 100648, 108344),
+    ('p7_3', 29439, 33249),
+    ('p4_1', 2050, 4531),
+    ('p2_1', 137536, 139256),
+]
+domain_file = join(DATA_DIR, 'domain_set_table.pddl')
+robot_model_file = join(MODEL_DIR, 'pepper.urdf')
+sim_fps = 30 if args.p else 120
+engine = HumoroDynamicLGP(domain_file=domain_file, robot_model_file=robot_model_file, path_to_mogaze=DATASET_DIR,
+                          sim_fps=sim_fps, prediction=args.p)
+start_agent_symbols = frozenset([('agent-avoid-human',), ('agent-free',)])
+end_agent_symbols = frozenset([('agent-at', 'table')])
+correlations, top1 = [], []
+for segment in test_segments:
+    objects = engine.hr.get_object_carries(segment, predicting=False)
+    problem = Experiment.get_problem_from_segment(engine.hr, segment, engine.domain, objects, start_agent_symbols, end_agent_symbols)
+    engine.init_planner(segment=segment, problem=problem, human_carry=3, trigger_period=10, human_freq='human-at', traj_init='outer')
+    lgp = engine.humoro_lgp
+    lgp.update_current_symbolic_state()
+    lgp.symbolic_plan()
+    lgp.place_human()
+    candidates = {}
+    for i, plan in enumerate(lgp.plans):
+        waypoints, waypoint_manifolds = lgp.get_waypoints(plan)
+        trajectory = linear_interpolation_waypoints_trajectory(waypoints)
+        candidates[i] = (trajectory, {'waypoint_manifolds': waypoint_manifolds, 'goal_manifold': waypoint_manifolds[-1][0]})
+    lgp.surrogate_ranking = True
+    surrogate = np.array([r[1] for r in lgp.rank_candidates(candidates)])
+    lgp.surrogate_ranking = False
+    full = np.array([r[1] for r in lgp.rank_candidates(candidates)])
+    # Spearman rank correlation between both rankings
+    surrogate_rank, full_rank = np.empty(len(surrogate)), np.empty(len(full))
+    surrogate_rank[surrogate], full_rank[full] = np.arange(len(surrogate)), np.arange(len(full))
+    rho = np.corrcoef(surrogate_rank, full_rank)[0, 1] if len(full) > 1 else 1.
+    correlations.append(rho)
+    top1.append(surrogate[0] == full[0])
+    print(f'{segment}: {len(full)} candidates, Spearman rho: {rho}, same best candidate: {top1[-1]}')
+print(f'Spearman rho: {np.mean(correlations)} +- {np.std(correlations)}')
+print(f'Top-1 agreement: {np.mean(top1)}')
@@ -2,11 +2,16 @@ import numpy as np
 import pybullet as p
 import time
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 import logging
 from lgp.logic.parser import PDDLParser
 from lgp.core.planner import HumoroLGP
 from lgp.geometry.geometry import get_angle, get_point_on_circle
 from lgp.geometry.workspace import Circle
+from lgp.geometry.scene import PyBulletScene
+from lgp.utils.frames import FrameWriter
+from lgp.utils.trace import TRACER
+from lgp.utils.recorder import ArrayRecorder, SeriesRecorder
 import matplotlib
 matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype'] = 42
@@ -18,7 +23,6 @@ _path_file = os.path.dirname(os.path.realpath(__file__))
 VIDEO_DIR = os.path.join(_path_file, '../../data/videos')
 sys.path.append(os.path.join(_path_file, "../../../humoro"))
 from examples.prediction.hmp_interface import HumanRollout
-from humoro.utility import storeimg
 
 
 class DynamicLGP(object):
@@ -53,9 +57,20 @@ class HumoroDynamicLGP(DynamicLGP):
         # useful variables
         self.robot_frame = self.humoro_lgp.workspace.robot_frame
         self.handling_circle = Circle(np.zeros(2), radius=0.3)
+        # background replanning in asynchronous mode, the thread only orchestrates: NLPs are solved in the optimizer worker process
+        self.planning_executor = ThreadPoolExecutor(max_workers=1)
+        self.pending_replan = None
         self.reset_experiment()
         self.image_dir = os.path.join(VIDEO_DIR, str(datetime.now()))
         os.makedirs(self.image_dir, exist_ok=True)
+        # frame capture
+        self.frame_decimation = kwargs.get('frame_decimation', 1)  # save one frame every frame_decimation timesteps
+        self.frame_queue_size = kwargs.get('frame_queue_size', 32)
+        self.frame_writers = kwargs.get('frame_writers', 2)
+        self.frame_drop = kwargs.get('frame_drop', False)  # drop frames instead of blocking the control loop when writers fall behind
+        if kwargs.get('trace', False):  # record planning phase spans, see export_trace
+            TRACER.clear()
+            TRACER.enable()
     
     def init_planner(self, **kwargs):
         if 'problem' not in kwargs:
@@ -66,8 +81,12 @@ class HumoroDynamicLGP(DynamicLGP):
         self.prev_robot_pos = self.humoro_lgp.workspace.get_robot_geometric_state()
         self.q = [0, 0, 0, 1]
         self.z_angle = 0.
-        self.actual_robot_path = []
-        self.actual_human_path = []
+        # recorders sized by sampling ticks, growing if the run exceeds the segment
+        ticks = min(self.humoro_lgp.timeout, self.humoro_lgp.workspace.duration // self.humoro_lgp.ratio) + 1
+        self.actual_robot_path = ArrayRecorder(shape=(2,), capacity=ticks)
+        self.actual_human_path = ArrayRecorder(shape=(2,), capacity=ticks)
+        for series in self._get_metric_series():
+            series.reserve(ticks // self.humoro_lgp.trigger_period + 1)
 
     def reset_experiment(self):
         # single plan
@@ -81,18 +100,28 @@ class HumoroDynamicLGP(DynamicLGP):
         self.single_actual_path = None
         self.single_complete_time = 0
         self.single_reduction_ratio = 0.
+        self.single_budget_use = None
+        self.single_num_skipped_nlp = 0
         # dynamic plan
-        self.dynamic_symbolic_plan_time = {}
+        self.dynamic_symbolic_plan_time = SeriesRecorder()
         self.dynamic_plans = {}
         self.dynamic_chosen_plan_id = {}
         self.dynamic_perceive_human_objects = {}
-        self.dynamic_geometric_plan_time = {}
+        self.dynamic_geometric_plan_time = SeriesRecorder()
         self.dynamic_plan_costs = {}
-        self.dynamic_num_failed_plans = {}
+        self.dynamic_num_failed_plans = SeriesRecorder(dtype=int)
         self.dynamic_num_change_plan = 0
         self.dynamic_actual_path = None
         self.dynamic_complete_time = 0
         self.dynamic_reduction_ratio = 0.
+        self.dynamic_plan_latency = SeriesRecorder()
+        self.dynamic_plan_staleness = SeriesRecorder(dtype=int)
+        self.dynamic_budget_use = SeriesRecorder()  # nan without time budget
+        self.dynamic_num_skipped_nlp = SeriesRecorder(dtype=int)
+
+    def _get_metric_series(self):
+        return [self.dynamic_symbolic_plan_time, self.dynamic_geometric_plan_time, self.dynamic_num_failed_plans, self.dynamic_plan_latency,
+                self.dynamic_plan_staleness, self.dynamic_budget_use, self.dynamic_num_skipped_nlp]
     
     def get_experiment_data(self):
         data = {
@@ -106,18 +135,25 @@ class HumoroDynamicLGP(DynamicLGP):
             'single_actual_path': self.single_actual_path,
             'single_complete_time': self.single_complete_time,
             'single_reduction_ratio': self.single_reduction_ratio,
-            'dynamic_symbolic_plan_time': self.dynamic_symbolic_plan_time,
+            'single_budget_use': self.single_budget_use,
+            'single_num_skipped_nlp': self.single_num_skipped_nlp,
+            'dynamic_symbolic_plan_time': self.dynamic_symbolic_plan_time.view(),
             'dynamic_plans': self.dynamic_plans,
             'dynamic_chosen_plan_id': self.dynamic_chosen_plan_id,
             'dynamic_perceive_human_objects': self.dynamic_perceive_human_objects,
-            'dynamic_geometric_plan_time': self.dynamic_geometric_plan_time,
+            'dynamic_geometric_plan_time': self.dynamic_geometric_plan_time.view(),
             'dynamic_plan_costs': self.dynamic_plan_costs,
-            'dynamic_num_failed_plans': self.dynamic_num_failed_plans,
+            'dynamic_num_failed_plans': self.dynamic_num_failed_plans.view(),
             'dynamic_num_change_plan': self.dynamic_num_change_plan,
             'dynamic_actual_path': self.dynamic_actual_path,
             'dynamic_complete_time': self.dynamic_complete_time,
             'dynamic_reduction_ratio': self.dynamic_reduction_ratio,
-            'human_path': self.actual_human_path
+            'dynamic_plan_latency': self.dynamic_plan_latency.view(),
+            'dynamic_plan_staleness': self.dynamic_plan_staleness.view(),
+            'dynamic_budget_use': self.dynamic_budget_use.view(),
+            'dynamic_num_skipped_nlp': self.dynamic_num_skipped_nlp.view(),
+            'human_path': self.actual_human_path.view(),
+            'plan_costs_type': 'surrogate' if self.humoro_lgp.surrogate_ranking else 'objective'  # cost recorded in single/dynamic_plan_costs
         }
         return data
 
@@ -137,7 +173,7 @@ class HumoroDynamicLGP(DynamicLGP):
             self.z_angle = z_angle if grad[1] > 0 else -z_angle
             self.q = p.getQuaternionFromEuler([0, 0, self.z_angle])  # + pi/2 due to default orientation of pepper is x-axis
         self.prev_robot_pos = current_robot_pos
-        p.resetBasePositionAndOrientation(self.humoro_lgp.player._robots[self.robot_frame], [*current_robot_pos, 0], self.q)
+        self.humoro_lgp.workspace.scene.set_pose(self.robot_frame, [*current_robot_pos, 0], self.q)
         # update object
         if self.humoro_lgp.plan is not None:
             current_action = self.humoro_lgp.get_current_action()
@@ -146,14 +182,96 @@ class HumoroDynamicLGP(DynamicLGP):
                 box = self.humoro_lgp.workspace.kin_tree.nodes[location]['link_obj']
                 x = np.random.uniform(box.origin[0] - box.dim[0] / 2, box.origin[0] + box.dim[0] / 2)  # TODO: should be desired place_pos on location, or add an animation of placing here
                 y = np.random.uniform(box.origin[1] - box.dim[1] / 2, box.origin[1] + box.dim[1] / 2)
-                p.resetBasePositionAndOrientation(self.humoro_lgp.player._objects[obj], [x, y, 0.735], [0, 0, 0, 1])  # currently ignore object orientation
+                self.humoro_lgp.workspace.scene.set_pose(obj, [x, y, 0.735])  # currently ignore object orientation
             elif robot.couplings:
                 for obj in robot.couplings:
                     self.handling_circle.origin = current_robot_pos
                     handling_pos = get_point_on_circle(self.z_angle, self.handling_circle)
-                    p.resetBasePositionAndOrientation(self.humoro_lgp.player._objects[obj], [*handling_pos, 1], [0, 0, 0, 1])  # TODO: for now attach object at robot origin
+                    self.humoro_lgp.workspace.scene.set_pose(obj, [*handling_pos, 1])  # TODO: for now attach object at robot origin
+
+    def record_replan(self, lgp_t, planner, success, symbolic_plan_time, geometric_plan_time):
+        '''
+        Record metrics of a replan triggered at lgp_t, symbolic_plan_time is None if no symbolic plan was made
+        '''
+        self.dynamic_geometric_plan_time.record(lgp_t, geometric_plan_time)
+        self.dynamic_budget_use.record(lgp_t, np.nan if planner.budget_use is None else planner.budget_use)
+        self.dynamic_num_skipped_nlp.record(lgp_t, planner.num_skipped_nlp)
+        if symbolic_plan_time is not None:
+            self.dynamic_num_change_plan += 1
+            self.dynamic_symbolic_plan_time.record(lgp_t, symbolic_plan_time)
+            self.dynamic_perceive_human_objects[lgp_t] = planner.perceive_human_objects
+            self.dynamic_chosen_plan_id[lgp_t] = planner.chosen_plan_id
+            self.dynamic_plans[lgp_t] = planner.get_list_plan_as_string()
+            self.dynamic_plan_costs[lgp_t] = planner.ranking
+            self.dynamic_num_failed_plans.record(lgp_t, planner.num_failed_nlp)
+
+    @staticmethod
+    def _plan_in_background(context):
+        with TRACER.span('background_replan', lgp_t=context.lgp_t):
+            symbolic_plan_time = None
+            if context.plan is None:
+                start_symbolic_plan = time.time()
+                context.symbolic_plan()
+                symbolic_plan_time = time.time() - start_symbolic_plan
+            start_geometric_plan = time.time()
+            success = context.geometric_replan()
+        return success, symbolic_plan_time, time.time() - start_geometric_plan
+
+    def export_trace(self, filename):
+        '''
+        Write the recorded spans as Chrome trace JSON, viewable in chrome://tracing or Perfetto
+        '''
+        TRACER.export(filename)
+
+    def submit_replan(self):
+        '''
+        Start replanning on a detached planning context while the current plan keeps executing
+        '''
+        self.humoro_lgp.update_current_symbolic_state()
+        context = self.humoro_lgp.fork_planning_context()
+        future = self.planning_executor.submit(HumoroDynamicLGP._plan_in_background, context)
+        self.pending_replan = (future, context, self.humoro_lgp.lgp_t, time.time())
+
+    def adopt_replan(self):
+        '''
+        Swap in the finished background plan, recording its latency (wall time) and staleness (simulation frames)
+        '''
+        future, context, lgp_t, submit_time = self.pending_replan
+        self.pending_replan = None
+        success, symbolic_plan_time, geometric_plan_time = future.result()
+        self.humoro_lgp.adopt_planning_context(context)
+        self.record_replan(lgp_t, context, success, symbolic_plan_time, geometric_plan_time)
+        self.dynamic_plan_latency.record(lgp_t, time.time() - submit_time)
+        self.dynamic_plan_staleness.record(lgp_t, self.humoro_lgp.lgp_t - lgp_t)
+        return success
 
-    def run(self, replan=False, sleep=False, save_frame=False):
+    def fast_forward(self, max_t):
+        '''
+        Skip the frames before the next sampling tick, timeout or termination, whose workspace updates would be
+        overwritten by the last one. The scene is shown at the frame before the last, so the workspace update
+        of the last frame reads the same scene state as when stepping every frame.
+        '''
+        lgp = self.humoro_lgp
+        end = min((lgp.lgp_t // lgp.ratio + 1) * lgp.ratio, max_t)  # next frame executing the loop body
+        last = end - 1
+        if lgp.symbolic_elapsed_t > lgp.get_current_plan_time():  # termination once the segment duration is exceeded
+            last = min(last, max(lgp.lgp_t, lgp.workspace.duration))
+        if last > lgp.lgp_t:
+            lgp.skip_timesteps(last - 1 - lgp.lgp_t)
+            lgp.visualize()
+            lgp.skip_timesteps(1)
+
+    def run(self, replan=False, sleep=False, save_frame=False, asynchronous=False, fast=False):
+        '''
+        asynchronous: in replan mode, plan in a background thread while executing the current plan, solving NLPs in a worker process
+        fast: headless mode skipping the workspace updates between sampling ticks
+        '''
+        if fast and (sleep or save_frame):
+            HumoroDynamicLGP.logger.warn('Fast mode does not support sleep or save_frame. Stepping every frame.')
+            fast = False
+        if save_frame and not isinstance(self.humoro_lgp.workspace.scene, PyBulletScene):
+            HumoroDynamicLGP.logger.warn('Saving frames needs the PyBullet scene. No frame will be saved.')
+            save_frame = False
         if not replan:
             self.humoro_lgp.update_current_symbolic_state()
             start_symbolic_plan = time.time()
@@ -162,43 +280,41 @@ class HumoroDynamicLGP(DynamicLGP):
             self.single_symbolic_plan_time = start_geometric_plan - start_symbolic_plan
             success = self.humoro_lgp.geometric_plan()
             self.single_geometric_plan_time = time.time() - start_geometric_plan
+            self.single_budget_use = self.humoro_lgp.budget_use
+            self.single_num_skipped_nlp = self.humoro_lgp.num_skipped_nlp
             self.single_plans = self.humoro_lgp.get_list_plan_as_string()
             self.single_chosen_plan_id = self.humoro_lgp.chosen_plan_id
             self.single_perceive_human_objects = self.humoro_lgp.perceive_human_objects
             self.single_plan_costs = self.humoro_lgp.ranking
-            for r in self.humoro_lgp.ranking:
-                if r[1] == self.humoro_lgp.chosen_plan_id:
-                    break
-                self.single_num_failed_plan += 1
+            self.single_num_failed_plan = self.humoro_lgp.num_failed_nlp
             if not success:
                 HumoroDynamicLGP.logger.info('Task failed!')
                 return False
+        if replan and asynchronous:
+            self.humoro_lgp.start_optimizer_worker()
+            success = False  # nothing to execute until the first background plan is adopted
+        if save_frame:
+            frame_writer = FrameWriter(self.image_dir, decimation=self.frame_decimation, queue_size=self.frame_queue_size,
+                                       num_writers=self.frame_writers, drop=self.frame_drop)
         max_t = self.humoro_lgp.timeout * self.humoro_lgp.ratio
         while self.humoro_lgp.lgp_t < max_t:
-            if replan and (self.humoro_lgp.lgp_t % (self.humoro_lgp.trigger_period * self.humoro_lgp.ratio) == 0):
-                self.humoro_lgp.update_current_symbolic_state()
-                if self.humoro_lgp.plan is None:
-                    self.dynamic_num_change_plan += 1
-                    start_symbolic_plan = time.time()
-                    success = self.humoro_lgp.symbolic_plan()
-                    self.dynamic_symbolic_plan_time[self.humoro_lgp.lgp_t] = time.time() - start_symbolic_plan
-                    self.dynamic_perceive_human_objects[self.humoro_lgp.lgp_t] = self.humoro_lgp.perceive_human_objects
-                start_geometric_plan = time.time()
-                success = self.humoro_lgp.geometric_replan()
-                self.dynamic_geometric_plan_time[self.humoro_lgp.lgp_t] = time.time() - start_geometric_plan
-                if self.humoro_lgp.lgp_t in self.dynamic_symbolic_plan_time:
-                    self.dynamic_chosen_plan_id[self.humoro_lgp.lgp_t] = self.humoro_lgp.chosen_plan_id
-                    self.dynamic_plans[self.humoro_lgp.lgp_t] = self.humoro_lgp.get_list_plan_as_string()
-                    self.dynamic_plan_costs[self.humoro_lgp.lgp_t] = self.humoro_lgp.ranking
-                    if success:
-                        n = 0
-                        for r in self.humoro_lgp.ranking:
-                            if r[1] == self.humoro_lgp.chosen_plan_id:
-                                break
-                            n += 1
-                        self.dynamic_num_failed_plans[self.humoro_lgp.lgp_t] = n
-                    else:
-                        self.dynamic_num_failed_plans[self.humoro_lgp.lgp_t] = len(self.humoro_lgp.ranking)
+            trigger = self.humoro_lgp.lgp_t % (self.humoro_lgp.trigger_period * self.humoro_lgp.ratio) == 0
+            if replan and asynchronous:
+                if self.pending_replan is not None and self.humoro_lgp.lgp_t % self.humoro_lgp.ratio == 0 and self.pending_replan[0].done():
+                    success = self.adopt_replan()  # swap in finished plan at tick boundary
+                if trigger and self.pending_replan is None:
+                    self.submit_replan()
+            elif replan and trigger:
+                with TRACER.span('trigger', lgp_t=self.humoro_lgp.lgp_t):
+                    self.humoro_lgp.update_current_symbolic_state()
+                    symbolic_plan_time = None
+                    if self.humoro_lgp.plan is None:
+                        start_symbolic_plan = time.time()
+                        success = self.humoro_lgp.symbolic_plan()
+                        symbolic_plan_time = time.time() - start_symbolic_plan
+                    start_geometric_plan = time.time()
+                    success = self.humoro_lgp.geometric_replan()
+                self.record_replan(self.humoro_lgp.lgp_t, self.humoro_lgp, success, symbolic_plan_time, time.time() - start_geometric_plan)
             if self.humoro_lgp.lgp_t % self.humoro_lgp.ratio == 0:
                 # executing current action in the plan
                 if replan:
@@ -211,23 +327,30 @@ class HumoroDynamicLGP(DynamicLGP):
                 # recording paths
                 self.actual_robot_path.append(self.humoro_lgp.workspace.get_robot_geometric_state())
                 self.actual_human_path.append(self.humoro_lgp.workspace.get_human_geometric_state())
+            if fast:
+                self.fast_forward(max_t)
             self.humoro_lgp.update_workspace()
             self.humoro_lgp.visualize()
             if save_frame:
-                storeimg(p, os.path.join(self.image_dir, str(self.humoro_lgp.lgp_t) + '.png'))
+                frame_writer.capture(self.humoro_lgp.lgp_t)
             self.humoro_lgp.increase_timestep()
             if self.humoro_lgp.lgp_t > self.humoro_lgp.workspace.duration and self.humoro_lgp.symbolic_elapsed_t > self.humoro_lgp.get_current_plan_time():
                 break
             if sleep:
                 time.sleep(1 / self.humoro_lgp.sim_fps)
+        if save_frame:
+            frame_writer.close()
+        if self.pending_replan is not None:  # discard in-flight plan
+            self.pending_replan[0].result()
+            self.pending_replan = None
         self.humoro_lgp.update_workspace()
         self.humoro_lgp.update_current_symbolic_state()
         if not replan:
-            self.single_actual_path = self.actual_robot_path
+            self.single_actual_path = self.actual_robot_path.view()
             self.single_complete_time = self.humoro_lgp.lgp_t / self.humoro_lgp.sim_fps
             self.single_reduction_ratio = self.humoro_lgp.lgp_t / self.hr.get_segment_timesteps(self.humoro_lgp.workspace.segment, predicting=False)
         else:
-            self.dynamic_actual_path = self.actual_robot_path
+            self.dynamic_actual_path = self.actual_robot_path.view()
             self.dynamic_complete_time = self.humoro_lgp.lgp_t / self.humoro_lgp.sim_fps
             self.dynamic_reduction_ratio = self.humoro_lgp.lgp_t / self.hr.get_segment_timesteps(self.humoro_lgp.workspace.segment, predicting=False)
         if self.check_goal_reached():
@@ -1,20 +1,23 @@
 import logging
+import copy
+import time
 import numpy as np
 import matplotlib.pyplot as plt
-from multiprocessing import Process
-from multiprocessing.sharedctypes import Value, Array
-from ctypes import c_bool, c_double
 import operator
 from lgp.logic.planner import LogicPlanner
+from lgp.logic.timeline import PredicateTimeline, TemporalPlanVerifier, PlanIndex
 from lgp.geometry.kinematics import PointObject
 from lgp.geometry.workspace import YamlWorkspace, HumoroWorkspace
-from lgp.geometry.trajectory import linear_interpolation_waypoints_trajectory
-from lgp.geometry.geometry import get_closest_point_on_circle, get_point_on_circle
+from lgp.geometry.trajectory import linear_interpolation_waypoints_trajectory, linear_interpolation_waypoints_trajectories
+from lgp.geometry.geometry import get_closest_points_on_circles, pack_circles, select_circles_near_path, merge_circles
 from lgp.optimization.objective import TrajectoryConstraintObjective
+from lgp.optimization.surrogate import SurrogateCost
+from lgp.optimization.worker import OptimizerWorker
+from lgp.optimization.infeasibility import InfeasibilityCache
+from lgp.utils.trace import traced
 
-from pyrieef.geometry.workspace import SignedDistanceWorkspaceMap, Workspace, Circle
-from pyrieef.motion.trajectory import Trajectory, linear_interpolation_trajectory
-from pyrieef.geometry.pixel_map import sdf
+from pyrieef.geometry.workspace import Workspace, Circle
+from pyrieef.motion.trajectory import linear_interpolation_trajectory
 
 # temporary importing until complication of install is resolve
 import os
@@ -103,10 +106,7 @@ class LGP(object):
             plt.show()
 
     def _compute_signed_dist_field(self, nb_points=100):
-        meshgrid = self.workspace.box.stacked_meshgrid(nb_points)
-        sdf_map = np.asarray(SignedDistanceWorkspaceMap(self.workspace)(meshgrid))
-        sdf_map = (sdf_map < 0).astype(float)
-        signed_dist_field = np.asarray(sdf(sdf_map))
+        signed_dist_field = self.workspace.get_sdf_raster(nb_points=nb_points).field
         signed_dist_field = np.flip(signed_dist_field, axis=0)
         signed_dist_field = np.interp(signed_dist_field, (signed_dist_field.min(), signed_dist_field.max()), (0, max(self.workspace.box.dim)))
         return signed_dist_field
@@ -163,17 +163,18 @@ class HumoroLGP(LGP):
         self.enable_viewer = kwargs.get('enable_viewer', False)
         self.logic_planner = LogicPlanner(domain)  # this will also build feasibility graph
         self.workspace = HumoroWorkspace(hr, **kwargs)
-        self.player = hr.p
         # action map
         self.action_map = {
             'move': self._move_action,
             'pick': self._pick_action,
             'place': self._place_action
         }
+        self.optimizer_worker = None
         # viewers
         if self.enable_viewer == True:
             workspace = Workspace(box=self.workspace.box)
             self.viewer = WorkspaceViewerServer(workspace, scale=130.)
+            self.optimizer_worker = OptimizerWorker()
 
     def init_planner(self, **kwargs):
         # LGP params
@@ -185,6 +186,24 @@ class HumoroLGP(LGP):
         self.traj_init = kwargs.get('traj_init', 'outer')  # initialization scheme for trajectory
         self.window_len = kwargs.get('window_len', 'max')  # frames, according to this sampling fps
         self.full_replan = kwargs.get('full_replan', True)
+        self.obstacle_corridor = kwargs.get('obstacle_corridor', None)  # meters around initial trajectory to keep human obstacles, None to keep all
+        self.max_merge_radius = kwargs.get('max_merge_radius', 0.6)  # max radius of merged human obstacles
+        self.surrogate_ranking = kwargs.get('surrogate_ranking', False)  # rank candidates by NumPy surrogate instead of full objectives
+        self.max_candidates = kwargs.get('max_candidates', None)  # number of best ranked candidates to optimize, None for all
+        self.surrogate = SurrogateCost(dt=1/self.fps)
+        self.time_budget = kwargs.get('time_budget', None)  # wall-clock seconds per geometric planning call, None for unbounded
+        self.nlp_budget_share = kwargs.get('nlp_budget_share', 0.5)  # share of the remaining budget given to each NLP
+        self.nlp_time_option = kwargs.get('nlp_time_option', 'max_cpu_time')  # IPOPT limit of each NLP: 'max_cpu_time' or 'max_wall_time' (IPOPT >= 3.14 only)
+        self.fallback = kwargs.get('fallback', 'stop')  # when nothing is feasible in replan: 'stop' or 'keep' the previous path
+        if self.fallback not in ('stop', 'keep'):
+            HumoroLGP.logger.error(f'Fallback policy {self.fallback} not support!')
+            raise ValueError()
+        self.infeasible_policy = kwargs.get('infeasible_policy', 'deprioritize')  # known infeasible candidates: 'skip', 'deprioritize' or None
+        if self.infeasible_policy not in ('skip', 'deprioritize', None):
+            HumoroLGP.logger.error(f'Infeasible policy {self.infeasible_policy} not support!')
+            raise ValueError()
+        self.infeasibility_cache = InfeasibilityCache(ttl=int(kwargs.get('infeasible_ttl', 2.0) * self.sim_fps),  # seconds
+                                                      resolution=kwargs.get('infeasible_resolution', 0.25))
         self.ratio = int(self.sim_fps / self.fps)
         # logic planner params
         problem = kwargs.get('problem')
@@ -196,22 +215,27 @@ class HumoroLGP(LGP):
         # init components
         self.logic_planner.init_planner(problem=problem, ignore_cache=ignore_cache)
         self.workspace.initialize_workspace_from_humoro(segment=segment, human_carry=human_carry, prediction=prediction, objects=problem.objects['object'])
+        if self.optimizer_worker is not None:
+            self.optimizer_worker.set_scene(self.workspace.box, self.get_static_workspace().obstacles)
         if self.window_len == 'max':
             self.window_len = int(self.workspace.duration / self.ratio)
         init_symbols = self.symbol_sanity_check()
         constant_symbols = [p for p in init_symbols if p[0] not in self.workspace.DEDUCED_PREDICATES]
         self.workspace.set_constant_symbol(constant_symbols)
+        self.timeline = PredicateTimeline.from_predicate_function(self.workspace.get_prediction_predicates, self.workspace.duration)
+        self.plan_verifier = TemporalPlanVerifier(self.timeline, self.workspace.VERIFY_PREDICATES)
         self._precompute_human_placement()
-        self.landmarks = {
-            'table': get_point_on_circle(np.pi/2, self.workspace.kin_tree.nodes['table']['limit']),
-            'big_shelf': get_point_on_circle(np.pi, self.workspace.kin_tree.nodes['big_shelf']['limit']),
-            'small_shelf': get_point_on_circle(0, self.workspace.kin_tree.nodes['small_shelf']['limit'])
-        }
+        self.landmarks = self.workspace.landmarks
         # dynamic parameters
         self.reset()
 
     def reset(self):
         self.clear_plan()
+        self.ranking = []
+        self.chosen_plan_id = None
+        self.budget_use = None
+        self.num_skipped_nlp = 0
+        self.num_failed_nlp = 0  # NLPs tried and failed by the last geometric planning call
         self.t = 0  # current environment timestep
         self.lgp_t = 0  # lgp time 
         self.symbolic_elapsed_t = 0  # elapsed time since the last unchanged first action, should be reset to 0 when first action in symbolic plan is changed
@@ -221,12 +245,71 @@ class HumoroLGP(LGP):
         self.workspace.get_robot_link_obj().paths.clear()
         self.plan = None
         self.plans = []
-        self.objectives = []
+        self.plan_indices = {}  # id of plan actions -> PlanIndex
+        self.objectives = {}
+
+    def start_optimizer_worker(self):
+        '''
+        Solve the NLPs in a separate process from now on. A background planning thread then waits on the worker
+        without holding the GIL while IPOPT runs, as a bewego solve in this process would hold it throughout.
+        '''
+        if self.optimizer_worker is None:
+            self.optimizer_worker = OptimizerWorker()
+        self.optimizer_worker.set_scene(self.workspace.box, self.get_static_workspace().obstacles)
+
+    def fork_planning_context(self):
+        '''
+        Shallow copy of this planner with detached plans, paths, obstacles and geometric state,
+        so it can plan in a background thread while this planner keeps executing its current plan.
+        Should call update_current_symbolic_state first.
+        '''
+        context = copy.copy(self)
+        context.logic_planner = copy.copy(self.logic_planner)
+        context.workspace = self.workspace.fork()
+        context.plans = list(self.plans)
+        context.plan_indices = dict(self.plan_indices)
+        context.objectives = {}
+        context.forked_geometric_elapsed_t = self.geometric_elapsed_t
+        return context
+
+    def adopt_planning_context(self, context):
+        '''
+        Swap in the plan of a background planning context.
+        The sampling ticks executed since the fork are skipped on the new plan, as the robot kept moving meanwhile.
+        '''
+        delta = self.geometric_elapsed_t - context.forked_geometric_elapsed_t
+        self.plan = context.plan
+        self.plans = context.plans
+        self.plan_indices = context.plan_indices
+        self.objectives = context.objectives
+        self.ranking = context.ranking
+        self.chosen_plan_id = context.chosen_plan_id
+        self.num_skipped_nlp = context.num_skipped_nlp
+        self.num_failed_nlp = context.num_failed_nlp
+        self.perceive_human_objects = context.perceive_human_objects
+        self.workspace.obstacles = context.workspace.obstacles
+        robot = self.workspace.get_robot_link_obj()
+        robot.paths[:] = context.workspace.get_robot_link_obj().paths
+        if self.plan is None:
+            self.symbolic_elapsed_t, self.geometric_elapsed_t = 0, 0
+        else:
+            self.symbolic_elapsed_t = context.symbolic_elapsed_t + delta
+            self.geometric_elapsed_t = context.geometric_elapsed_t + delta
+
+    def get_plan_index(self, plan):
+        '''
+        Cumulative duration index of a plan, built once per plan
+        '''
+        index = self.plan_indices.get(id(plan[1]))
+        if index is None or index.actions is not plan[1]:
+            index = PlanIndex(plan[1])
+            self.plan_indices[id(plan[1])] = index
+        return index
 
     def get_current_plan_time(self):
         if self.plan is None:
             return 0
-        return sum([a.duration for a in self.plan[1]])
+        return self.get_plan_index(self.plan).total
     
     def check_verifying_action(self, action):
         for p in action.positive_preconditions.union(action.negative_preconditions):
@@ -262,49 +345,34 @@ class HumoroLGP(LGP):
                 self.symbolic_elapsed_t += 1
                 self.geometric_elapsed_t += 1
 
+    def skip_timesteps(self, n):
+        '''
+        Advance n frames at once without crossing a sampling tick, so the elapsed times of the plan are unchanged
+        '''
+        if self.t < self.workspace.duration:
+            self.t = min(self.t + n, self.workspace.duration)
+        self.lgp_t += n
+
     def verify_plan(self, plan=None):
         '''
         For now, only action move relies on predicate predictions.
         This function should be extended to account for other actions that rely on predicate predictions.
-        This checks for over all and end time preconditions.
+        This checks for start and end time preconditions.
         NOTE: now not used!
         '''
         if plan is None:
             if self.plan is None:
                 return False
             plan = self.plan
-        plan_t = -self.symbolic_elapsed_t
-        for action in plan[1]:
-            if plan_t + action.duration > 0:
-                if self.check_verifying_action(action):
-                    # print('Action: ', action.name + ' ' + ' '.join(action.parameters))
-                    # start precondition
-                    start = True
-                    if not (plan_t < 0 and plan_t + action.duration > 0):  # don't check for start precondition for currently executing first action
-                        p = self.workspace.get_prediction_predicates(self.t + plan_t * self.ratio)
-                        start = LogicPlanner.applicable(p, action.start_positive_preconditions, action.start_negative_preconditions)
-                        # print('Start: ', p, action.start_positive_preconditions, action.start_negative_preconditions, self.t + plan_t)
-                    # TODO: implement check for over all precondition when needed 
-                    # end precondition
-                    plan_t += action.duration
-                    if plan_t > self.window_len:  # don't verify outside window
-                        break
-                    p = self.workspace.get_prediction_predicates(self.t + plan_t * self.ratio)
-                    end = LogicPlanner.applicable(p, action.end_positive_preconditions, action.end_negative_preconditions)
-                    # print('End: ', p, action.end_positive_preconditions, action.end_negative_preconditions, self.t + plan_t)
-                    # print('Result: ', start and end)
-                    if not (start and end):
-                        return False
-                else:
-                    plan_t += action.duration
-                    if plan_t > self.window_len:  # don't verify outside window
-                        break
-            else:
-                plan_t += action.duration
-                if plan_t > self.window_len:  # don't verify outside window
-                    break
-        return True
-    
+        return bool(self.verify_plans([plan])[0])
+
+    def verify_plans(self, plans):
+        '''
+        Verify all candidate plans at once against the predicted predicate timeline.
+        '''
+        # TODO: implement check for over all precondition when needed
+        return self.plan_verifier.verify(plans, self.t, self.symbolic_elapsed_t, self.ratio, self.window_len)
+
     def check_plan(self, plan=None):
         '''
         Check if the plan can lead to goal from current state
@@ -322,13 +390,14 @@ class HumoroLGP(LGP):
             return True
         return False
 
+    @traced('update_goal')
     def update_goal(self):
         self.perceive_human_objects = []
-        for t in range(self.window_len):
-            symbols = self.workspace.get_prediction_predicates(self.t + t * self.ratio)
-            obj = self._get_human_carry_obj(symbols)
-            if obj is not None and obj in self.workspace.objects:
-                goal_p = self._get_predicate_obj(self.logic_planner.problem.positive_goals[0], obj, 'on')  # for now there is only + goals                
+        window_end = self.t + (self.window_len - 1) * self.ratio
+        for p in self.timeline.predicates_in('human-carry', self.t, window_end):
+            obj = p[1]
+            if obj in self.workspace.objects:
+                goal_p = self._get_predicate_obj(self.logic_planner.problem.positive_goals[0], obj, 'on')  # for now there is only + goals
                 if goal_p is not None and goal_p not in self.logic_planner.current_state:
                     state_p = self._get_predicate_obj(self.logic_planner.current_state, obj)
                     if state_p is not None and state_p[0] == 'on':
@@ -342,31 +411,43 @@ class HumoroLGP(LGP):
             plan = self.plan
             if plan is None:
                 return None, None
-        prev_pivot = self.workspace.get_robot_geometric_state()
-        waypoints = [(prev_pivot, 0)]
-        waypoint_manifolds = []
-        t = -self.symbolic_elapsed_t
-        for action in plan[1]:
-            if t + action.duration > 0:
-                if action.name == 'move':
-                    location_frame = action.parameters[0]
-                    limit_circle = self.workspace.kin_tree.nodes[location_frame]['limit']
-                    if self.traj_init == 'nearest':
-                        p = get_closest_point_on_circle(prev_pivot, limit_circle)
-                    elif self.traj_init == 'outer':
-                        p = self.landmarks[location_frame]
-                    else:
-                        HumoroLGP.logger.error(f'Traj init scheme {self.traj_init} not support!')
-                        raise ValueError()
-                    waypoints.append((p, t + action.duration))
-                    waypoint_manifolds.append((limit_circle, t + action.duration))
-                    prev_pivot = self.workspace.geometric_state[location_frame]
-            t += action.duration
-        if len(waypoints) == 1 or (not waypoint_manifolds):
-            HumoroLGP.logger.warn(f'Elapsed time: {self.symbolic_elapsed_t} is larger than total time: {t} of original plan!')
-            return None, None
-        return waypoints, waypoint_manifolds
+        return self.get_waypoints_batch([plan])[0]
 
+    def get_waypoints_batch(self, plans):
+        '''
+        Waypoints and waypoint manifolds of several plans, projecting the waypoints of all plans in one call
+        '''
+        robot_pos = self.workspace.get_robot_geometric_state()
+        moves = []
+        for plan in plans:
+            index = self.get_plan_index(plan)
+            moves.append([(index.actions[k].parameters[0], index.ends[k] - self.symbolic_elapsed_t) for k in index.moves_after(self.symbolic_elapsed_t)])
+        locations = [location for plan_moves in moves for location, _ in plan_moves]
+        if self.traj_init == 'nearest':
+            # each move starts from the previous location, the first one from the robot
+            pivots = [robot_pos if i == 0 else self.workspace.geometric_state[plan_moves[i - 1][0]]
+                      for plan_moves in moves for i in range(len(plan_moves))]
+            origins, radii = pack_circles([self.workspace.kin_tree.nodes[location]['limit'] for location in locations])
+            points = get_closest_points_on_circles(np.array(pivots).reshape(-1, 2), origins, radii)
+        elif self.traj_init == 'outer':
+            points = [self.landmarks[location] for location in locations]
+        else:
+            HumoroLGP.logger.error(f'Traj init scheme {self.traj_init} not support!')
+            raise ValueError()
+        results, j = [], 0
+        for plan, plan_moves in zip(plans, moves):
+            if not plan_moves:
+                t = self.get_plan_index(plan).total - self.symbolic_elapsed_t
+                HumoroLGP.logger.warn(f'Elapsed time: {self.symbolic_elapsed_t} is larger than total time: {t} of original plan!')
+                results.append((None, None))
+                continue
+            waypoints = [(robot_pos, 0)] + [(points[j + i], t) for i, (_, t) in enumerate(plan_moves)]
+            waypoint_manifolds = [(self.workspace.kin_tree.nodes[location]['limit'], t) for location, t in plan_moves]
+            results.append((waypoints, waypoint_manifolds))
+            j += len(plan_moves)
+        return results
+
+    @traced('place_human')
     def place_human(self):
         '''
         Populate human as obstacles
@@ -392,23 +473,51 @@ class HumoroLGP(LGP):
                     human_pos = self.workspace.hr.get_human_pos_2d(self.workspace.segment, sim_t)
                     self.workspace.obstacles[self.workspace.HUMAN_FRAME + str(sim_t)] = Circle(origin=human_pos, radius=self.workspace.HUMAN_RADIUS)
 
+    def _get_human_obstacles(self):
+        return [o for name, o in self.workspace.obstacles.items() if self.workspace.HUMAN_FRAME in name]
+
+    def get_static_workspace(self):
+        '''
+        Workspace of the obstacles which do not change within a segment, i.e. all but the human ones
+        '''
+        workspace = Workspace(box=self.workspace.box)
+        workspace.obstacles = [o for name, o in self.workspace.obstacles.items() if not self.workspace.is_dynamic_obstacle(name)]
+        return workspace
+
+    def get_candidate_obstacles(self, trajectory):
+        '''
+        Human obstacles for one candidate NLP: the ones outside a corridor around the initial trajectory are dropped
+        and overlapping ones are merged into bounding circles
+        '''
+        human_obstacles = self._get_human_obstacles()
+        if self.obstacle_corridor is None:
+            return human_obstacles
+        points = trajectory.x().reshape(-1, trajectory.n())
+        selected = select_circles_near_path(human_obstacles, points, self.obstacle_corridor)
+        selected = merge_circles(selected, max_radius=self.max_merge_radius)
+        if self.verbose:
+            HumoroLGP.logger.info(f'Human obstacles: {len(human_obstacles)} placed, {len(selected)} after selection and merging')
+        return selected
+
+    @traced('symbolic_plan')
     def symbolic_plan(self, alternative=True, verify_plan=False):
         '''
         This function plan the feasible symbolic trajectory
         '''
         self.clear_plan()
         paths, act_seqs = self.logic_planner.plan(alternative=alternative)
-        for path, acts in zip(paths, act_seqs):
-            plan = (path, acts)
-            if verify_plan:
-                if self.verify_plan(plan=plan):
-                    self.plans.append(plan)
-            else:
-                self.plans.append(plan)
+        plans = list(zip(paths, act_seqs))
+        if verify_plan:
+            verified = self.verify_plans(plans)
+            plans = [plan for plan, v in zip(plans, verified) if v]
+        self.plans.extend(plans)
+        for plan in self.plans:
+            self.get_plan_index(plan)
         if not self.plans:
             return False
         return True
 
+    @traced('geometric_plan')
     def geometric_plan(self):
         '''
         This function plans full geometric trajectory at initial
@@ -416,47 +525,28 @@ class HumoroLGP(LGP):
         if not self.plans:
             HumoroLGP.logger.warn('Symbolic plan is empty. Cannot plan trajectory!')
             return False
+        self._start_budget()
         # prepare workspace
         self.place_human()
-        workspace = self.workspace.get_pyrieef_ws()
-        self.ranking = []
         self.chosen_plan_id = None
-        # compute plan costs
-        for i, plan in enumerate(self.plans):
-            waypoints, waypoint_manifolds = self.get_waypoints(plan)
-            trajectory = linear_interpolation_waypoints_trajectory(waypoints)
-            objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
-            objective.set_problem(workspace=workspace, trajectory=trajectory, waypoint_manifolds=waypoint_manifolds, goal_manifold=waypoint_manifolds[-1][0])
-            self.objectives.append(objective)
-            self.ranking.append((objective.cost(), i))
+        candidates = self._get_waypoint_candidates(self.plans)
         # rank the plans
-        self.ranking.sort(key=operator.itemgetter(0))
+        self.ranking = self.rank_candidates(candidates)
         # optimize the objective according to self.ranking
-        for r in self.ranking:
-            if self.enable_viewer:
-                self.viewer.initialize_viewer(self.objectives[r[1]], self.objectives[r[1]].trajectory)
-                status = Value(c_bool, True)
-                traj = Array(c_double, self.objectives[r[1]].n * (self.objectives[r[1]].T + 2))
-                p = Process(target=self.objectives[r[1]].optimize, args=(status, traj))
-                p.start()
-                self.viewer.run()
-                p.join()
-                success = status.value
-                traj = Trajectory(q_init=np.array(traj[:2]), x=np.array(traj[2:]))
-            else:
-                success, traj = self.objectives[r[1]].optimize()
-            if success:  # choose this plan
-                self.plan = self.plans[r[1]]
-                self.chosen_plan_id = r[1]
-                if self.verbose:
-                    for a in self.plan[1]:
-                        HumoroLGP.logger.info(a.name + ' ' + ' '.join(a.parameters))
-                robot = self.workspace.get_robot_link_obj()
-                robot.paths.append(traj)
-                return True
+        i, traj = self._solve_ranking(candidates)
+        if i is not None:  # choose this plan
+            self.plan = self.plans[i]
+            self.chosen_plan_id = i
+            if self.verbose:
+                for a in self.plan[1]:
+                    HumoroLGP.logger.info(a.name + ' ' + ' '.join(a.parameters))
+            robot = self.workspace.get_robot_link_obj()
+            robot.paths.append(traj)
+            return True
         HumoroLGP.logger.warn('All plan geometrical optimization infeasible!')
         return False
 
+    @traced('geometric_replan')
     def geometric_replan(self):
         '''
         This function plan partial trajectory upto next symbolic change
@@ -464,125 +554,255 @@ class HumoroLGP(LGP):
         if not self.plans and self.plan is None:
             HumoroLGP.logger.warn('Symbolic plan is empty. Cannot plan geometric trajectory!')
             return False
+        self._start_budget()
         if not self._check_move():
             return True
         # clear previous paths
         robot = self.workspace.get_robot_link_obj()
+        prev_paths, prev_geometric_elapsed_t = list(robot.paths), self.geometric_elapsed_t
         robot.paths.clear()
         self.objectives.clear()
         self.geometric_elapsed_t = 0
         # prepare workspace
         self.place_human()
-        workspace = self.workspace.get_pyrieef_ws()
         if self.plan is not None:  # current symbolic plan is still feasible, continue with this plan
             if not self.check_plan():
                 self.plan = None  # remove current symbolic plan
                 self.symbolic_elapsed_t = 0  # reset symbolic elapsed time
                 HumoroLGP.logger.warn(f'Current symbolic plan becomes symbolically infeasible at time {self.lgp_t}. Trying replanning at next trigger.')
                 return False
-            a, t = self._get_next_move(self.plan)
-            location = a.parameters[0]
-            current = self.workspace.get_robot_geometric_state()
-            goal_manifold = self.workspace.kin_tree.nodes[location]['limit']
-            if self.traj_init == 'nearest':
-                goal = get_closest_point_on_circle(current, goal_manifold)
-            elif self.traj_init == 'outer':
-                goal = self.landmarks[location]
-            else:
-                HumoroLGP.logger.error(f'Traj init scheme {self.traj_init} not support!')
-                raise ValueError()
-            if self.full_replan:
-                waypoints, waypoint_manifolds = self.get_waypoints()
-                trajectory = linear_interpolation_waypoints_trajectory(waypoints)
-                objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
-                objective.set_problem(workspace=workspace, trajectory=trajectory, waypoint_manifolds=waypoint_manifolds, goal_manifold=waypoint_manifolds[-1][0])
-            else:
-                trajectory = linear_interpolation_trajectory(current, goal, t)
-                objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
-                objective.set_problem(workspace=workspace, trajectory=trajectory, goal_manifold=goal_manifold)
-            if self.enable_viewer:
-                self.viewer.initialize_viewer(objective, objective.trajectory)
-                status = Value(c_bool, True)
-                traj = Array(c_double, objective.n * (objective.T + 2))
-                p = Process(target=objective.optimize, args=(status, traj))
-                p.start()
-                self.viewer.run()
-                p.join()
-                success = status.value
-                traj = Trajectory(q_init=np.array(traj[:2]), x=np.array(traj[2:]))
-            else:
-                success, traj = objective.optimize()
+            trajectory, problem = self._get_replan_candidate(self.plan)
+            objective = self._build_objective(trajectory, problem, build=self.optimizer_worker is None)
+            skipped = self._budget_exhausted()
+            success, traj = (False, None) if skipped else self._solve(objective, self._get_nlp_options(objective, 1))
             if success:
                 robot.paths.append(traj)
                 return True
+            if skipped:
+                self.num_skipped_nlp += 1
+            else:
+                self.num_failed_nlp += 1
+            if traj is not None and self.infeasible_policy is not None:
+                self.infeasibility_cache.add(self._get_infeasibility_key(self.plan), self.lgp_t)
+            if self.fallback == 'keep' and prev_paths:
+                robot.paths.extend(prev_paths)
+                self.geometric_elapsed_t = prev_geometric_elapsed_t
+                HumoroLGP.logger.warn(f'Current symbolic plan is geometrically infeasible at time {self.lgp_t}. Keeping previous path.')
+                return True
             else:
                 self.plan = None  # remove current symbolic plan
                 self.symbolic_elapsed_t = 0  # reset symbolic elapsed time
                 HumoroLGP.logger.warn(f'Current symbolic plan becomes geometrically infeasible at time {self.lgp_t}. Trying replanning at next trigger.')
                 return False
         else:
-            self.ranking = []
             self.chosen_plan_id = None
-            for i, plan in enumerate(self.plans):
-                a, t = self._get_next_move(plan)
-                location = a.parameters[0]
-                current = self.workspace.get_robot_geometric_state()
-                goal_manifold = self.workspace.kin_tree.nodes[location]['limit']
-                if self.traj_init == 'nearest':
-                    goal = get_closest_point_on_circle(current, goal_manifold)
-                elif self.traj_init == 'outer':
-                    goal = self.landmarks[location]
-                else:
-                    HumoroLGP.logger.error(f'Traj init scheme {self.traj_init} not support!')
-                    raise ValueError()
-                if self.full_replan:
-                    waypoints, waypoint_manifolds = self.get_waypoints(plan)
-                    trajectory = linear_interpolation_waypoints_trajectory(waypoints)
-                    objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
-                    objective.set_problem(workspace=workspace, trajectory=trajectory, waypoint_manifolds=waypoint_manifolds, goal_manifold=waypoint_manifolds[-1][0])
-                else:
-                    trajectory = linear_interpolation_trajectory(current, goal, t)
-                    objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
-                    objective.set_problem(workspace=workspace, trajectory=trajectory, goal_manifold=goal_manifold)
-                self.objectives.append(objective)
-                self.ranking.append((objective.cost(), i))
+            candidates = self._get_replan_candidates(self.plans)
             # rank the plans
-            self.ranking.sort(key=operator.itemgetter(0))
+            self.ranking = self.rank_candidates(candidates)
             # optimize the objective according to self.ranking
-            for r in self.ranking:
-                if self.enable_viewer:
-                    self.viewer.initialize_viewer(self.objectives[r[1]], self.objectives[r[1]].trajectory)
-                    status = Value(c_bool, True)
-                    traj = Array(c_double, self.objectives[r[1]].n * (self.objectives[r[1]].T + 2))
-                    p = Process(target=self.objectives[r[1]].optimize, args=(status, traj))
-                    p.start()
-                    self.viewer.run()
-                    p.join()
-                    success = status.value
-                    traj = Trajectory(q_init=np.array(traj[:2]), x=np.array(traj[2:]))
-                else:
-                    success, traj = self.objectives[r[1]].optimize()
-                if success:  # choose this plan
-                    self.plan = self.plans[r[1]]
-                    self.chosen_plan_id = r[1]
-                    if self.verbose:
-                        for a in self.plan[1]:
-                            HumoroLGP.logger.info(a.name + ' ' + ' '.join(a.parameters))
-                    robot.paths.append(traj)
-                    return True
+            i, traj = self._solve_ranking(candidates)
+            if i is not None:  # choose this plan
+                self.plan = self.plans[i]
+                self.chosen_plan_id = i
+                if self.verbose:
+                    for a in self.plan[1]:
+                        HumoroLGP.logger.info(a.name + ' ' + ' '.join(a.parameters))
+                robot.paths.append(traj)
+                return True
             HumoroLGP.logger.warn(f'All replan geometrical optimization infeasible at current time {self.lgp_t}. Trying replanning at next trigger.')
             return False
 
+    @traced('rank_candidates')
+    def rank_candidates(self, candidates):
+        '''
+        Rank candidates {plan index: (init trajectory, problem params)} by cost, return sorted (cost, plan index).
+        With surrogate ranking, all init trajectories are scored at once without building any optimizer.
+        '''
+        if self.surrogate_ranking:
+            self.surrogate.set_obstacles(list(self.workspace.obstacles.values()))
+            costs = self.surrogate.costs([trajectory for trajectory, _ in candidates.values()])
+            ranking = list(zip(costs.tolist(), candidates.keys()))
+        else:
+            ranking = []
+            for i, (trajectory, problem) in candidates.items():
+                self.objectives[i] = self._build_objective(trajectory, problem)
+                ranking.append((self.objectives[i].cost(), i))
+        ranking.sort(key=operator.itemgetter(0))
+        return ranking
+
+    def _get_waypoint_candidates(self, plans):
+        '''
+        Waypoint-interpolated candidates {plan index: (init trajectory, problem params)}, built in batch for all plans
+        '''
+        waypoints = self.get_waypoints_batch(plans)
+        trajectories = linear_interpolation_waypoints_trajectories([w for w, _ in waypoints])
+        candidates = {}
+        for i, (trajectory, (_, waypoint_manifolds)) in enumerate(zip(trajectories, waypoints)):
+            candidates[i] = (trajectory, {'waypoint_manifolds': waypoint_manifolds, 'goal_manifold': waypoint_manifolds[-1][0]})
+        return candidates
+
+    def _get_replan_candidate(self, plan):
+        return self._get_replan_candidates([plan])[0]
+
+    def _get_replan_candidates(self, plans):
+        '''
+        Replan candidates {plan index: (init trajectory, problem params)}, with the goals of all plans projected in one call
+        '''
+        if self.full_replan:
+            return self._get_waypoint_candidates(plans)
+        next_moves = [self._get_next_move(plan) for plan in plans]
+        locations = [a.parameters[0] for a, _ in next_moves]
+        current = self.workspace.get_robot_geometric_state()
+        goal_manifolds = [self.workspace.kin_tree.nodes[location]['limit'] for location in locations]
+        if self.traj_init == 'nearest':
+            goals = get_closest_points_on_circles(current, *pack_circles(goal_manifolds))
+        elif self.traj_init == 'outer':
+            goals = [self.landmarks[location] for location in locations]
+        else:
+            HumoroLGP.logger.error(f'Traj init scheme {self.traj_init} not support!')
+            raise ValueError()
+        candidates = {}
+        for i, (goal, (_, t), goal_manifold) in enumerate(zip(goals, next_moves, goal_manifolds)):
+            candidates[i] = (linear_interpolation_trajectory(current, goal, t), {'goal_manifold': goal_manifold})
+        return candidates
+
+    @traced('build_objective')
+    def _build_objective(self, trajectory, problem, build=True):
+        '''
+        Objective of one candidate, without building its optimizer (build=False) when it is solved by the optimizer worker
+        '''
+        objective = TrajectoryConstraintObjective(dt=1/self.fps, enable_viewer=self.enable_viewer)
+        objective.set_problem(workspace=self.get_static_workspace(), obstacles=self.get_candidate_obstacles(trajectory),
+                              trajectory=trajectory, build=build, **problem)
+        return objective
+
+    def _solve_ranking(self, candidates):
+        '''
+        Optimize candidates in ranking order, building their full objectives lazily.
+        Return plan index and trajectory of the first feasible candidate, (None, None) if all fail.
+        '''
+        tries, known = self.ranking, []
+        if self.infeasible_policy is not None:
+            self.infeasibility_cache.expire(self.lgp_t)
+            fingerprint = self.infeasibility_cache.fingerprint(self._get_human_obstacles())
+            keys = {r[1]: self._get_infeasibility_key(self.plans[r[1]], fingerprint) for r in self.ranking}
+            known = [r for r in self.ranking if keys[r[1]] in self.infeasibility_cache]
+            tries = [r for r in self.ranking if keys[r[1]] not in self.infeasibility_cache]
+            if self.infeasible_policy == 'deprioritize':
+                tries = tries + known
+        if self.max_candidates is not None:
+            tries = tries[:self.max_candidates]
+        result, num_tried, num_out_of_budget = (None, None), 0, 0
+        for n, r in enumerate(tries):
+            i = r[1]
+            if self._budget_exhausted():  # the remaining candidates are skipped, not failed
+                num_out_of_budget = len(tries) - n
+                break
+            if i not in self.objectives:
+                self.objectives[i] = self._build_objective(*candidates[i], build=self.optimizer_worker is None)
+            success, traj = self._solve(self.objectives[i], self._get_nlp_options(self.objectives[i], len(tries) - n))
+            num_tried += 1
+            if success:
+                result = (i, traj)
+                break
+            self.num_failed_nlp += 1
+            if traj is not None and self.infeasible_policy is not None:
+                self.infeasibility_cache.add(keys[i], self.lgp_t)
+        num_known_skipped = len(known) - len([r for r in tries[:num_tried] if r in known])
+        self.num_skipped_nlp = num_known_skipped + num_out_of_budget
+        if self.verbose and self.num_skipped_nlp:
+            HumoroLGP.logger.info(f'Skipped {num_known_skipped} NLPs of known infeasible candidates and {num_out_of_budget} out of time budget.')
+        return result
+
+    def _get_infeasibility_key(self, plan, fingerprint=None):
+        '''
+        Remaining move targets of the plan together with the human obstacles fingerprint
+        '''
+        if fingerprint is None:
+            fingerprint = self.infeasibility_cache.fingerprint(self._get_human_obstacles())
+        index = self.get_plan_index(plan)
+        return tuple(index.actions[k].parameters[0] for k in index.moves_after(self.symbolic_elapsed_t)), fingerprint
+
+    def _start_budget(self):
+        self.plan_start_time = time.time()
+        self.budget_use = None if self.time_budget is None else 0.  # fraction of the time budget used by this call
+        self.num_skipped_nlp = 0
+        self.num_failed_nlp = 0
+
+    def _budget_exhausted(self):
+        '''
+        Whether the time budget of this geometric planning call is used up, updating budget_use
+        '''
+        if self.time_budget is None:
+            return False
+        self.budget_use = (time.time() - self.plan_start_time) / self.time_budget
+        if self.budget_use < 1.:
+            return False
+        HumoroLGP.logger.warn(f'Time budget exhausted at time {self.lgp_t}.')
+        return True
+
+    def _get_nlp_options(self, objective, num_left):
+        '''
+        IPOPT options bounding the NLP by its share of the remaining time budget, the last NLP gets all of it
+        '''
+        if self.time_budget is None:
+            return None
+        remaining = self.time_budget - (time.time() - self.plan_start_time)
+        share = remaining if num_left <= 1 else remaining * self.nlp_budget_share
+        return dict(objective.ipopt_options, **{self.nlp_time_option: share})
+
+    def _solve(self, objective, ipopt_options=None):
+        '''
+        Optimize a candidate. With a corridor, the solution is checked against all obstacles, as it may leave the corridor
+        and collide with a pruned human obstacle, and it is solved again with all of them if so.
+        '''
+        success, traj = self._optimize(objective, ipopt_options)
+        if success and self.obstacle_corridor is not None and not self._is_clear(objective, traj):
+            HumoroLGP.logger.warn(f'Solution collides with pruned human obstacles at time {self.lgp_t}. Solving again with all obstacles.')
+            full = TrajectoryConstraintObjective(**objective.kwargs)
+            full.set_problem(**dict(objective.problem_kwargs, obstacles=self._get_human_obstacles(), trajectory=traj))  # warm start
+            success, traj = self._optimize(full, None if ipopt_options is None else self._get_nlp_options(full, 1))
+        return success, traj
+
+    def _is_clear(self, objective, traj):
+        '''
+        Whether a trajectory keeps the obstacle margin to all workspace obstacles
+        '''
+        clearance = self.workspace.get_sdf().signed_distance(traj.x().reshape(-1, traj.n())[1:]).min()
+        return clearance >= objective.s_obstacle_margin - objective.ipopt_options['constr_viol_tol']
+
+    @traced('optimize')
+    def _optimize(self, objective, ipopt_options=None):
+        '''
+        Solve one NLP. When it stops at its time limit, its last iterate is returned as success if it satisfies the constraints.
+        '''
+        if ipopt_options is not None and self._budget_exhausted():
+            return False, None
+        start = time.time()
+        if self.optimizer_worker is not None:  # solve in the worker process, the viewer streams intermediate iterates meanwhile
+            if self.enable_viewer:
+                self.viewer.initialize_viewer(objective, objective.trajectory)
+            self.optimizer_worker.submit(objective, ipopt_options)
+            if self.enable_viewer:
+                self.viewer.run()
+            success, traj = self.optimizer_worker.result()
+        else:
+            success, traj = objective.optimize(ipopt_options=ipopt_options)
+        # the wall clock is checked here as well, a CPU time limit does not bound the wall time of the solve
+        elapsed = time.time() - start
+        if self.time_budget is not None:
+            self.budget_use = (time.time() - self.plan_start_time) / self.time_budget
+        if not success and traj is not None and ipopt_options is not None and elapsed >= ipopt_options[self.nlp_time_option]:
+            success = objective.is_feasible(traj)
+            if success and self.verbose:
+                HumoroLGP.logger.info(f'NLP stopped at its time limit with a feasible iterate at time {self.lgp_t}.')
+        return success, traj
+
     def get_current_action(self):
         if self.plan is None:
             HumoroLGP.logger.warn('Symbolic plan is empty. Cannot get current action!')
             return None
-        t = 0
-        for action in self.plan[1]:
-            if t + action.duration > self.symbolic_elapsed_t:
-                return action
-            t += action.duration
-        return None
+        return self.get_plan_index(self.plan).action_at(self.symbolic_elapsed_t)
 
     def get_list_plan_as_string(self):
         if not self.plans:
@@ -626,15 +846,14 @@ class HumoroLGP(LGP):
         if self.workspace.kin_tree.has_edge(self.workspace.robot_frame, obj_frame):
             return
         # take control of obj traj on visualization from now (reflecting robot action)
-        if obj_frame in self.player._playbackTrajsObj:
-            del self.player._playbackTrajsObj[obj_frame]
+        self.workspace.scene.release_object(obj_frame)
         robot = self.workspace.get_robot_link_obj()
         obj_property = self.workspace.kin_tree.nodes[obj_frame]
         robot.attach_object(obj_frame, obj_property['link_obj'])
         # update kinematic tree (attaching object at agent origin, this could change if needed)
         if self.workspace.kin_tree.has_edge(location_frame, obj_frame):
             self.workspace.kin_tree.remove_edge(location_frame, obj_frame)
-        obj_property['link_obj'] = PointObject(origin=np.zeros(self.workspace.geometric_state_shape))
+        self.workspace.kin_tree.set_link(obj_frame, PointObject(origin=np.zeros(self.workspace.geometric_state_shape)))
         self.workspace.kin_tree.add_edge(self.workspace.robot_frame, obj_frame)
 
     def _place_action(self, action, place_pos=None, sanity_check=True):
@@ -655,18 +874,9 @@ class HumoroLGP(LGP):
         self.workspace.kin_tree.remove_edge(self.workspace.robot_frame, obj_frame)
         if place_pos is None:
             place_pos = np.zeros(self.workspace.geometric_state_shape)
-        obj_property['link_obj'] = PointObject(origin=place_pos)
+        self.workspace.kin_tree.set_link(obj_frame, PointObject(origin=place_pos))
         self.workspace.kin_tree.add_edge(location_frame, obj_frame)
 
-    def _get_human_carry_obj(self, s):
-        '''
-        Assuming human carries only one object
-        '''
-        for p in s:
-            if p[0] == 'human-carry':
-                return p[1]
-        return None
-    
     def _get_predicate_obj(self, s, obj, pred=None):
         '''
         Assuming object on only one place
@@ -682,45 +892,19 @@ class HumoroLGP(LGP):
 
     def _check_move(self):
         if self.plan is not None:
-            t = 0
-            for a in self.plan[1]:
-                if t + a.duration > self.symbolic_elapsed_t:
-                    if a.name == 'move':
-                        return True
-                t += a.duration
-            return False
-        elif self.plans:
-            for plan in self.plans:
-                for a in plan[1]:
-                    if a.name == 'move':
-                        return True
-        return False
+            return self.get_plan_index(self.plan).has_move_after(self.symbolic_elapsed_t)
+        return any(self.get_plan_index(plan).has_move_after() for plan in self.plans)
     
     def _get_next_move(self, plan):
         if not plan:
             return None, 0
-        t = -self.symbolic_elapsed_t
-        for a in plan[1]:
-            t += a.duration
-            if t > 0:
-                if a.name == 'move':
-                    return a, t
-        return None, t
+        return self.get_plan_index(plan).next_move_at(self.symbolic_elapsed_t)
 
     def _precompute_human_placement(self):
         self.human_placements = {}
-        prev_at, at = False, False
-        for t in range(self.workspace.duration):
-            s = self.workspace.get_prediction_predicates(t)
-            at = False
-            for p in s:
-                if p[0] == 'human-at':
-                    at = True
-                    break
-            if at and not prev_at:
-                human_pos = self.workspace.hr.get_human_pos_2d(self.workspace.segment, t)
-                self.human_placements[t] = Circle(origin=human_pos, radius=self.workspace.HUMAN_RADIUS)
-            prev_at = at
+        for t in self.timeline.rising_edges('human-at'):
+            human_pos = self.workspace.hr.get_human_pos_2d(self.workspace.segment, t)
+            self.human_placements[t] = Circle(origin=human_pos, radius=self.workspace.HUMAN_RADIUS)
 
     def visualize(self):
         self.workspace.visualize_frame(self.t)
@@ -32,14 +32,20 @@ class Experiment(object):
         os.makedirs(self.data_dir, exist_ok=True)
         sim_fps = kwargs.get('sim_fps', 120)
         self.prediction = kwargs.get('prediction', False)
+        scene = kwargs.get('scene', 'pybullet')  # 'numpy' runs without updating PyBullet
+        self.trace = kwargs.get('trace', False)  # export planning phase spans next to the data
+        layout_dir = kwargs.get('layout_dir', None)  # directory of static layout snapshots per recording
         self.engine = HumoroDynamicLGP(domain_file=domain_file, robot_model_file=robot_model_file, path_to_mogaze=mogaze_dir, 
-                                       sim_fps=sim_fps, prediction=self.prediction, verbose=self.verbose)
+                                       sim_fps=sim_fps, prediction=self.prediction, verbose=self.verbose, scene=scene, trace=self.trace,
+                                       layout_dir=layout_dir)
         # experiment params
         self.test_segments = kwargs.get('test_segments', None)  # test segments takes precedent
         self.total_pnp = kwargs.get('total_pnp', [4, 5, 6, 7])
         self.taskid = kwargs.get('taskid', [2, 3])  # set table for 2, 3 people
         self.human_carry = kwargs.get('human_carry', 3)
         self.trigger_period = kwargs.get('trigger_period', 10)
+        self.fast = kwargs.get('fast', False)  # skip frames between sampling ticks
+        self.asynchronous = kwargs.get('asynchronous', False)  # replan in the background while executing the current plan
         self.start_agent_symbols = frozenset([('agent-avoid-human',), ('agent-free',)])
         self.end_agent_symbols = frozenset([('agent-at', 'table')])
         self.get_segments()
@@ -81,6 +87,8 @@ class Experiment(object):
     def save_data(self):
         with open(self.data_name, 'wb') as f:
             pickle.dump(self.segment_data, f)
+        if self.trace:
+            self.engine.export_trace(self.data_name + '.trace.json')
     
     def run(self):
         for segment, problem in self.segments.items():
@@ -88,12 +96,12 @@ class Experiment(object):
             self.engine.init_planner(segment=segment, problem=problem, 
                                      human_carry=self.human_carry, trigger_period=self.trigger_period,
                                      human_freq='human-at', traj_init='outer')
-            single_success = self.engine.run(replan=False, sleep=False)
+            single_success = self.engine.run(replan=False, sleep=False, fast=self.fast)
             # dynamic plan
             self.engine.init_planner(segment=segment, problem=problem, 
                                      human_carry=self.human_carry, trigger_period=self.trigger_period,
                                      human_freq='once', traj_init='nearest')
-            dynamic_success = self.engine.run(replan=True, sleep=False)
+            dynamic_success = self.engine.run(replan=True, sleep=False, asynchronous=self.asynchronous, fast=self.fast)
             data = self.engine.get_experiment_data()
             data['single_success'] = single_success
             data['dynamic_success'] = dynamic_success
@@ -1,32 +1,126 @@
 import numpy as np
+from pyrieef.geometry.workspace import Circle, Box
 
 
 def get_angle(v1, v2):
     '''
     Get angle from 2 vectors
     '''
-    return np.arccos(np.dot(v1, v2) / (np.linalg.norm(v1) * np.linalg.norm(v2)))
+    return float(get_angles(v1, v2))
 
 
 def get_point_on_circle(angle, circle):
-    x = circle.origin[0] + (circle.radius * np.cos(angle))
-    y = circle.origin[1] + (circle.radius * np.sin(angle))
-    return np.array([x, y])
+    return get_points_on_circles(angle, circle.origin, circle.radius)
 
 
 def get_closest_point_on_circle(p, circle):
     '''
     Finding the closest x,y coordinates on circle, based on given point
     '''
-    x_vec = np.array([1, 0])
-    v = p - circle.origin
-    angle = get_angle(v, x_vec) 
-    angle = angle if v[1] > 0 else -angle
-    return get_point_on_circle(angle, circle)
+    return get_closest_points_on_circles(p, circle.origin, circle.radius)
+
+
+def pack_circles(circles):
+    '''
+    Origins (M, 2) and radii (M,) of a list of circles
+    '''
+    origins = np.array([c.origin for c in circles], dtype=float).reshape(-1, 2)
+    radii = np.array([c.radius for c in circles], dtype=float)
+    return origins, radii
+
+
+def get_angles(v1, v2):
+    '''
+    Unsigned angles in [0, pi] between vectors of shape (..., 2), broadcast against each other.
+    arctan2 of cross and dot products stays accurate near 0 and pi where arccos does not.
+    '''
+    v1, v2 = np.asarray(v1, dtype=float), np.asarray(v2, dtype=float)
+    cross = v1[..., 0] * v2[..., 1] - v1[..., 1] * v2[..., 0]
+    return np.arctan2(np.abs(cross), np.sum(v1 * v2, axis=-1))
+
+
+def get_polar_angles(points, origins):
+    '''
+    Angles in (-pi, pi] of points around origins, shapes (..., 2) broadcast against each other
+    '''
+    v = np.asarray(points, dtype=float) - np.asarray(origins, dtype=float)
+    return np.arctan2(v[..., 1], v[..., 0])
+
+
+def get_points_on_circles(angles, origins, radii):
+    '''
+    Points at angles on circles, angles (...), origins (..., 2) and radii (...) broadcast against each other
+    '''
+    angles, radii = np.asarray(angles, dtype=float), np.asarray(radii, dtype=float)
+    return np.asarray(origins, dtype=float) + radii[..., None] * np.stack([np.cos(angles), np.sin(angles)], axis=-1)
+
+
+def get_closest_points_on_circles(points, origins, radii):
+    '''
+    Closest points on circles of points (..., 2), origins (..., 2) and radii (...) broadcast against each other.
+    Use points[:, None] against origins[None] to project N points on M circles as (N, M, 2).
+    A point at a circle origin is projected at angle 0.
+    '''
+    return get_points_on_circles(get_polar_angles(points, origins), origins, radii)
+
+
+def get_bounding_circle(c1, c2):
+    '''
+    Smallest circle enclosing two circles
+    '''
+    v = c2.origin - c1.origin
+    d = np.linalg.norm(v)
+    if d + c2.radius <= c1.radius:
+        return Circle(origin=np.array(c1.origin), radius=c1.radius)
+    if d + c1.radius <= c2.radius:
+        return Circle(origin=np.array(c2.origin), radius=c2.radius)
+    radius = (d + c1.radius + c2.radius) / 2
+    origin = c1.origin + v / d * (radius - c1.radius)
+    return Circle(origin=origin, radius=radius)
+
+
+def merge_circles(circles, max_radius=np.inf):
+    '''
+    Greedily merge overlapping circles into bounding circles, a merge is skipped if the bounding circle exceeds max_radius
+    '''
+    merged = []
+    for c in circles:
+        for i, m in enumerate(merged):
+            if np.linalg.norm(c.origin - m.origin) < c.radius + m.radius:
+                bounding = get_bounding_circle(m, c)
+                if bounding.radius <= max_radius:
+                    merged[i] = bounding
+                    break
+        else:
+            merged.append(c)
+    return merged
+
+
+def select_circles_near_path(circles, points, corridor):
+    '''
+    Keep circles whose border is within corridor distance of any point of the path (points has shape (N, 2))
+    '''
+    if not circles:
+        return []
+    origins = np.array([c.origin for c in circles])
+    radii = np.array([c.radius for c in circles], dtype=float)
+    dists = np.linalg.norm(origins[:, None, :] - points[None, :, :], axis=2).min(axis=1) - radii
+    return [c for c, d in zip(circles, dists) if d <= corridor]
+
+
+def is_inside(shape, points):
+    '''
+    Vectorized is_inside of a circle or box for points of shape (N, 2)
+    '''
+    points = np.asarray(points).reshape(-1, 2)
+    if isinstance(shape, Circle):
+        return np.linalg.norm(points - shape.origin, axis=1) < shape.radius
+    if isinstance(shape, Box):
+        return np.all(np.abs(points - shape.origin) < np.asarray(shape.dim) / 2, axis=1)
+    return np.array([shape.is_inside(x) for x in points], dtype=bool)
 
 
 if __name__ == '__main__':
-    from pyrieef.geometry.workspace import Circle 
     circle = Circle(origin=np.zeros(2), radius=1.0)
     p = np.array([0, 2])
     print(get_closest_point_on_circle(p, circle))
@@ -39,4 +133,4 @@ if __name__ == '__main__':
     p = np.array([1, -1])
     print(get_closest_point_on_circle(p, circle))
     p = np.array([1, 0])
-    print(get_closest_point_on_circle(p, circle))
\ No newline at end of file
+    print(get_closest_point_on_circle(p, circle))
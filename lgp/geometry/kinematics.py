@@ -16,12 +16,18 @@ class Human(Circle):
     SUPPORTED_PREDICATES = ()
 
     def __init__(self, **kwargs):
-        origin = np.asarray(kwargs.get('origin', np.zeros(2)))
+        origin = np.array(kwargs.get('origin', np.zeros(2)), dtype=float)  # own copy, updated in place
         radius = np.asarray(kwargs.get('radius', 0.2))
         self.name = kwargs.get('name', 'human')
         self.kinematic_map = LinearTranslation(origin)
         super(Human, self).__init__(origin=origin, radius=radius)
 
+    def set_origin(self, origin):
+        '''
+        In-place pose update, the kinematic map shares the origin array
+        '''
+        self.origin[:] = origin
+
     def predict(self):  # TODO: extend this method for human motion prediction
         return np.array([self.origin])
 
@@ -48,7 +54,7 @@ class Robot(Circle):
     SUPPORTED_PREDICATES = ('carry', 'free')
 
     def __init__(self, **kwargs):
-        origin = np.asarray(kwargs.get('origin', np.zeros(2)))
+        origin = np.array(kwargs.get('origin', np.zeros(2)), dtype=float)  # own copy, updated in place
         radius = np.asarray(kwargs.get('radius', 0.2))
         self.name = kwargs.get('name', 'robot')
         self.init_symbol = frozenset_of_tuples(kwargs.get('init_symbol', []))
@@ -57,6 +63,12 @@ class Robot(Circle):
         self.couplings = {}  # hold objects. TODO: replace by a kinematic tree later if robot is more complex.
         super(Robot, self).__init__(origin=origin, radius=radius)
 
+    def set_origin(self, origin):
+        '''
+        In-place pose update, the kinematic map shares the origin array
+        '''
+        self.origin[:] = origin
+
     def attach_object(self, name, obj):
         self.couplings[name] = obj
 
@@ -95,11 +107,17 @@ class Robot(Circle):
 
 class BoxObject(Box):
     def __init__(self, **kwargs):
-        origin = np.asarray(kwargs.get('origin', np.zeros(2)))
+        origin = np.array(kwargs.get('origin', np.zeros(2)), dtype=float)  # own copy, updated in place
         dim = np.asarray(kwargs.get('dim', np.ones(2)))
         self.kinematic_map = LinearTranslation(origin)
         super(BoxObject, self).__init__(origin=origin, dim=dim)
 
+    def set_origin(self, origin):
+        '''
+        In-place pose update, the kinematic map shares the origin array
+        '''
+        self.origin[:] = origin
+
     @property
     def extents(self):
         return tuple(self.dim.tolist())
@@ -107,10 +125,16 @@ class BoxObject(Box):
 
 class PointObject(Shape):
     def __init__(self, **kwargs):
-        self.origin = np.asarray(kwargs.get('origin', np.zeros(2)))
+        self.origin = np.array(kwargs.get('origin', np.zeros(2)), dtype=float)  # own copy, updated in place
         self.kinematic_map = LinearTranslation(self.origin)
         super(PointObject, self).__init__()
 
+    def set_origin(self, origin):
+        '''
+        In-place pose update, the kinematic map shares the origin array
+        '''
+        self.origin[:] = origin
+
     def closest_point(self, x):
         return point_distance_gradient(x, self.origin)
 
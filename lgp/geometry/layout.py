@@ -0,0 +1,59 @@
+import logging
+import numpy as np
+from pyrieef.geometry.workspace import Circle
+
+from lgp.geometry.kinematics import OBJECT_MAP
+from lgp.geometry.geometry import get_point_on_circle
+
+
+class StaticLayout(object):
+    '''
+    Static layout of a MoGaze recording: chairs as obstacles, table and shelves as locations with their areas, limits and landmarks.
+    It does not change between segments of a recording, so it is read from the scene once and kept as a compact array snapshot.
+    '''
+    logger = logging.getLogger(__name__)
+    CHAIR_DIM = [.20, .35]
+    CHAIR_RADIUS = 0.25
+    # location -> scene body, box dim, area radius, limit radius, obstacle radius, landmark angle on limit
+    LOCATIONS = {
+        'table': ('table', [.8, .8], 1.2, 1.0, 0.8, np.pi/2),
+        'small_shelf': ('vesken_shelf', [.36, .22], 0.75, 0.7, 0.4, 0),
+        'big_shelf': ('laiva_shelf', [.24, .59], 0.85, 0.8, 0.5, np.pi),
+    }
+
+    def __init__(self, chairs, locations):
+        self.chairs = np.asarray(chairs, dtype=float).reshape(-1, 2)
+        self.locations = {name: np.asarray(locations[name], dtype=float) for name in StaticLayout.LOCATIONS}
+        self.landmarks = {name: get_point_on_circle(spec[5], self.get_limit(name)) for name, spec in StaticLayout.LOCATIONS.items()}
+
+    @staticmethod
+    def from_scene(scene, chairs):
+        names = list(chairs) + [spec[0] for spec in StaticLayout.LOCATIONS.values()]
+        positions = scene.get_positions(names)[:, :2]
+        return StaticLayout(positions[:len(chairs)], dict(zip(StaticLayout.LOCATIONS, positions[len(chairs):])))
+
+    @staticmethod
+    def load(filename):
+        with np.load(filename) as data:
+            return StaticLayout(data['chairs'], {name: data[name] for name in StaticLayout.LOCATIONS})
+
+    def save(self, filename):
+        np.savez(filename, chairs=self.chairs, **self.locations)
+
+    def get_chair(self, i):
+        return OBJECT_MAP['box_obj'](origin=self.chairs[i].copy(), dim=np.array(StaticLayout.CHAIR_DIM))
+
+    def get_chair_obstacle(self, i):
+        return Circle(origin=self.chairs[i].copy(), radius=StaticLayout.CHAIR_RADIUS)
+
+    def get_location(self, name):
+        return OBJECT_MAP['box_obj'](origin=self.locations[name].copy(), dim=np.array(StaticLayout.LOCATIONS[name][1]))
+
+    def get_area(self, name):
+        return Circle(origin=self.locations[name].copy(), radius=StaticLayout.LOCATIONS[name][2])
+
+    def get_limit(self, name):
+        return Circle(origin=self.locations[name].copy(), radius=StaticLayout.LOCATIONS[name][3])
+
+    def get_obstacle(self, name):
+        return Circle(origin=self.locations[name].copy(), radius=StaticLayout.LOCATIONS[name][4])
@@ -0,0 +1,82 @@
+import logging
+import numpy as np
+from pyrieef.geometry.workspace import Circle, Box
+
+from lgp.geometry.geometry import is_inside
+
+
+class RegionIndex(object):
+    '''
+    Uniform grid over the workspace extent listing, for each cell, the regions whose bounding box overlaps it.
+    Membership queries only run exact is_inside tests on the candidates of the query cells.
+    Regions are tested in the given order, so the first containing region wins as in a linear scan.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, regions, extent, resolution=0.5):
+        self.names = [name for name, _ in regions]
+        self.shapes = [shape for _, shape in regions]
+        self.resolution = resolution
+        self.lower = np.array([extent[0], extent[2]], dtype=float)
+        upper = np.array([extent[1], extent[3]], dtype=float)
+        self.dims = np.maximum(np.ceil((upper - self.lower) / resolution).astype(int), 1)
+        self.candidates = np.zeros((self.dims[0] * self.dims[1], len(self.shapes)), dtype=bool)
+        for k, shape in enumerate(self.shapes):
+            if isinstance(shape, Circle):
+                lo, hi = shape.origin - shape.radius, shape.origin + shape.radius
+            elif isinstance(shape, Box):
+                lo, hi = shape.origin - np.asarray(shape.dim) / 2, shape.origin + np.asarray(shape.dim) / 2
+            else:  # unknown bounds, candidate everywhere
+                self.candidates[:, k] = True
+                continue
+            (i0, j0), (i1, j1) = self._get_cell_coords(lo), self._get_cell_coords(hi)
+            cells = np.zeros(self.dims, dtype=bool)
+            cells[i0:i1 + 1, j0:j1 + 1] = True
+            self.candidates[:, k] = cells.ravel()
+
+    def _get_cell_coords(self, points):
+        return np.clip(np.floor((points - self.lower) / self.resolution).astype(int), 0, self.dims - 1)
+
+    def _get_cells(self, points):
+        coords = self._get_cell_coords(points)
+        return coords[..., 0] * self.dims[1] + coords[..., 1]
+
+    def query(self, x):
+        '''
+        First region containing point x, 'unknown' if none
+        '''
+        for k in np.flatnonzero(self.candidates[self._get_cells(np.asarray(x))]):
+            if self.shapes[k].is_inside(x):
+                return self.names[k]
+        return 'unknown'
+
+    def query_all(self, x):
+        '''
+        All regions containing point x
+        '''
+        return [self.names[k] for k in np.flatnonzero(self.candidates[self._get_cells(np.asarray(x))])
+                if self.shapes[k].is_inside(x)]
+
+    def contains(self, points):
+        '''
+        Boolean (N, K) membership of points of shape (N, 2) in the K regions
+        '''
+        points = np.asarray(points).reshape(-1, 2)
+        candidates = self.candidates[self._get_cells(points)]
+        inside = np.zeros_like(candidates)
+        for k, shape in enumerate(self.shapes):
+            mask = candidates[:, k]
+            if mask.any():
+                inside[mask, k] = is_inside(shape, points[mask])
+        return inside
+
+    def query_batch(self, points):
+        '''
+        Batched query, first containing region of each point as an object array
+        '''
+        inside = self.contains(points)
+        if not self.names:
+            return np.full(len(inside), 'unknown', dtype=object)
+        names = np.array(self.names + ['unknown'], dtype=object)
+        first = np.where(inside.any(axis=1), inside.argmax(axis=1), len(self.names))
+        return names[first]
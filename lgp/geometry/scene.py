@@ -0,0 +1,149 @@
+import logging
+import numpy as np
+import pybullet as p
+
+
+class Scene(object):
+    '''
+    Backend holding the poses of the objects and robots of the simulated scene.
+    The humoro player drives the objects from the recorded segment until they are released to the robot.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, hr):
+        self.hr = hr
+
+    def load(self, segment):
+        self.hr.load_for_playback(segment)
+
+    def has_object(self, name):
+        return name in self.hr.p._objects
+
+    def get_playback(self):
+        '''
+        Recorded object trajectories of the humoro player, {name: {'traj': (T, 7) poses, 'startframe': int}}.
+        This is private player state, so its layout is checked to fail clearly on a humoro version that changed it.
+        '''
+        playback = getattr(self.hr.p, '_playbackTrajsObj', None)
+        if not isinstance(playback, dict) or not all(isinstance(v, dict) and 'traj' in v for v in playback.values()):
+            raise RuntimeError('Unsupported humoro version: the player does not keep its object playback trajectories as expected.')
+        return playback
+
+    def release_object(self, name):
+        '''
+        Stop playback of the recorded object trajectory, the object is controlled by the robot from now
+        '''
+        playback = self.get_playback()
+        if name in playback:
+            del playback[name]
+
+    def show_frame(self, segment, t):
+        raise NotImplementedError()
+
+    def get_position(self, name):
+        raise NotImplementedError()
+
+    def get_positions(self, names):
+        '''
+        Positions of all named bodies as a (N, 3) array
+        '''
+        return np.array([self.get_position(name) for name in names]).reshape(-1, 3)
+
+    def set_pose(self, name, pos, orn=(0, 0, 0, 1)):
+        raise NotImplementedError()
+
+    def spawn_robot(self, name, urdf):
+        raise NotImplementedError()
+
+
+class PyBulletScene(Scene):
+    '''
+    Scene in the PyBullet client of the humoro player
+    '''
+
+    def _get_id(self, name):
+        if name in self.hr.p._robots:
+            return self.hr.p._robots[name]
+        return self.hr.p._objects[name]
+
+    def show_frame(self, segment, t):
+        self.hr.visualize_frame(segment, t)
+
+    def get_position(self, name):
+        pos, _ = p.getBasePositionAndOrientation(self._get_id(name))
+        return np.array(pos)
+
+    def set_pose(self, name, pos, orn=(0, 0, 0, 1)):
+        p.resetBasePositionAndOrientation(self._get_id(name), pos, orn)
+
+    def spawn_robot(self, name, urdf):
+        if name not in self.hr.p._robots:
+            self.hr.p.spawnRobot(name, urdf=urdf)
+
+
+class NumpyScene(Scene):
+    '''
+    In-memory scene keeping poses as arrays, for headless batch experiments without stepping PyBullet.
+    Frames are replayed from the object trajectories loaded in the humoro player, as its showframe does.
+    '''
+
+    def __init__(self, hr):
+        super(NumpyScene, self).__init__(hr)
+        self.index = {}
+        self.positions = np.zeros((0, 3))
+        self.orientations = np.zeros((0, 4))
+
+    def _register(self, name):
+        if name not in self.index:
+            self.index[name] = len(self.index)
+            self.positions = np.vstack([self.positions, np.zeros(3)])
+            self.orientations = np.vstack([self.orientations, [0., 0., 0., 1.]])
+        return self.index[name]
+
+    def has_object(self, name):
+        return name in self.index
+
+    def _get_index(self, name):
+        if name not in self.index:
+            raise KeyError(f'Unknown body {name} in the scene.')
+        return self.index[name]
+
+    def load(self, segment):
+        '''
+        Load the segment and register all recorded bodies at their first recorded pose
+        '''
+        super(NumpyScene, self).load(segment)
+        for name, playback in self.get_playback().items():
+            i = self._register(name)
+            self.positions[i] = playback['traj'][0][:3]
+            self.orientations[i] = playback['traj'][0][3:7]
+
+    def show_frame(self, segment, t):
+        frame = segment[1] + t
+        for name, playback in self.get_playback().items():
+            traj, start = playback['traj'], playback.get('startframe', 0)
+            if start <= frame < start + len(traj):
+                i = self._register(name)
+                self.positions[i] = traj[frame - start][:3]
+                self.orientations[i] = traj[frame - start][3:7]
+
+    def get_position(self, name):
+        return self.positions[self._get_index(name)].copy()
+
+    def get_positions(self, names):
+        indices = [self._get_index(name) for name in names]
+        return self.positions[indices].reshape(-1, 3)
+
+    def set_pose(self, name, pos, orn=(0, 0, 0, 1)):
+        i = self._get_index(name)
+        self.positions[i] = pos
+        self.orientations[i] = orn
+
+    def spawn_robot(self, name, urdf):
+        self._register(name)
+
+
+SCENE_MAP = {
+    'pybullet': PyBulletScene,
+    'numpy': NumpyScene,
+}
@@ -0,0 +1,184 @@
+import logging
+import numpy as np
+from pyrieef.geometry.workspace import Circle, Box
+
+
+class ObstacleSDF(object):
+    '''
+    Signed distance of a set of circles and boxes, packed in contiguous parameter arrays.
+    Distances, gradients and the closest obstacle are evaluated for point batches of shape (..., 2) in a few NumPy operations.
+    Obstacles keep their given order, so ties resolve to the first one as in a loop over them.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, obstacles=()):
+        self.pack(obstacles)
+
+    def pack(self, obstacles):
+        '''
+        Pack obstacles given as a list or a dict name -> shape, unsupported shapes are skipped
+        '''
+        items = obstacles.items() if isinstance(obstacles, dict) else enumerate(obstacles)
+        circles, boxes, circle_names, box_names, names = [], [], [], [], []
+        for name, o in items:
+            if isinstance(o, Circle):
+                circles.append(o)
+                circle_names.append(name)
+                names.append(name)
+            elif isinstance(o, Box):
+                boxes.append(o)
+                box_names.append(name)
+                names.append(name)
+            else:
+                ObstacleSDF.logger.warn('Shape {} not supported by signed distance engine'.format(type(o)))
+        self.centers = np.array([c.origin for c in circles], dtype=float).reshape(-1, 2)
+        self.radii = np.array([c.radius for c in circles], dtype=float)
+        self.box_origins = np.array([b.origin for b in boxes], dtype=float).reshape(-1, 2)
+        self.box_half_dims = np.array([np.asarray(b.dim) / 2 for b in boxes], dtype=float).reshape(-1, 2)
+        # columns of the packed circles then boxes, back to the given obstacle order
+        position = {name: i for i, name in enumerate(circle_names + box_names)}
+        self.order = np.array([position[name] for name in names], dtype=int)
+        self.names = names
+        return self
+
+    @property
+    def size(self):
+        return len(self.names)
+
+    def distances(self, points):
+        '''
+        Signed distance to each obstacle, points has shape (..., 2), returns shape (..., M)
+        '''
+        points = np.asarray(points, dtype=float)
+        dc = np.linalg.norm(points[..., None, :] - self.centers, axis=-1) - self.radii
+        q = np.abs(points[..., None, :] - self.box_origins) - self.box_half_dims
+        db = np.linalg.norm(np.maximum(q, 0.), axis=-1) + np.minimum(q.max(axis=-1, initial=-np.inf), 0.)
+        return np.concatenate([dc, db], axis=-1)[..., self.order]
+
+    def signed_distance(self, points):
+        '''
+        Minimum signed distance to all obstacles, inf without obstacles
+        '''
+        return self.closest(points)[0]
+
+    def closest(self, points):
+        '''
+        Minimum signed distance and index of the closest obstacle
+        '''
+        points = np.asarray(points, dtype=float)
+        if not self.size:
+            return np.full(points.shape[:-1], np.inf), np.full(points.shape[:-1], -1, dtype=int)
+        d = self.distances(points)
+        i = d.argmin(axis=-1)
+        return np.take_along_axis(d, i[..., None], axis=-1)[..., 0], i
+
+    def in_collision(self, points):
+        return self.signed_distance(points) < 0.
+
+    def gradients(self, points):
+        '''
+        Signed distance gradient with respect to each obstacle, returns shape (..., M, 2)
+        '''
+        points = np.asarray(points, dtype=float)
+        v = points[..., None, :] - self.centers
+        norm = np.linalg.norm(v, axis=-1, keepdims=True)
+        gc = np.divide(v, norm, out=np.zeros_like(v), where=norm > 0.)
+        u = points[..., None, :] - self.box_origins
+        q = np.abs(u) - self.box_half_dims
+        outside = np.maximum(q, 0.)
+        norm = np.linalg.norm(outside, axis=-1, keepdims=True)
+        inside = np.zeros_like(q)  # unit vector along the axis of the closest face
+        np.put_along_axis(inside, q.argmax(axis=-1)[..., None], 1., axis=-1)
+        gb = np.sign(u) * np.where(norm > 0., outside / np.where(norm > 0., norm, 1.), inside)
+        return np.concatenate([gc, gb], axis=-2)[..., self.order, :]
+
+    def gradient(self, points):
+        '''
+        Signed distance gradient with respect to the closest obstacle, returns shape (..., 2).
+        Like the minimum distance it has a kink where two obstacles are at the same distance.
+        '''
+        _, i = self.closest(points)
+        if not self.size:
+            return np.zeros(np.shape(points), dtype=float)
+        return np.take_along_axis(self.gradients(points), i[..., None, None], axis=-2)[..., 0, :]
+
+
+class SDFRaster(object):
+    '''
+    Signed distance field rasterized on a regular grid over the workspace box, queried by bilinear interpolation.
+    Static obstacles are packed and rasterized once at construction, transient obstacles (humans) are composited on top by elementwise min.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, box, nb_points=100, static=()):
+        self.nb_points = nb_points
+        extent = box.box_extent()
+        self.lower = np.array([extent[0], extent[2]], dtype=float)
+        self.upper = np.array([extent[1], extent[3]], dtype=float)
+        self.resolution = (self.upper - self.lower) / (nb_points - 1)
+        xs = np.linspace(extent[0], extent[1], nb_points)
+        ys = np.linspace(extent[2], extent[3], nb_points)
+        self.points = np.stack(np.meshgrid(xs, ys), axis=-1)  # (nb_points, nb_points, 2), rows along y
+        self.static_sdf = ObstacleSDF(static)
+        self.static_field = self.static_sdf.signed_distance(self.points)
+        self.dynamic_sdf = ObstacleSDF()
+        self.field = self.static_field
+
+    @staticmethod
+    def _same_layout(a, b):
+        return (a.names == b.names and np.array_equal(a.centers, b.centers) and np.array_equal(a.radii, b.radii) and
+                np.array_equal(a.box_origins, b.box_origins) and np.array_equal(a.box_half_dims, b.box_half_dims))
+
+    def update(self, dynamic=()):
+        '''
+        Composite the dynamic obstacles on the static raster, only when they changed
+        '''
+        dynamic_sdf = ObstacleSDF(dynamic)
+        if not SDFRaster._same_layout(dynamic_sdf, self.dynamic_sdf):
+            self.dynamic_sdf = dynamic_sdf
+            if dynamic_sdf.size:
+                self.field = np.minimum(self.static_field, dynamic_sdf.signed_distance(self.points))
+            else:
+                self.field = self.static_field
+        return self
+
+    def _locate(self, points):
+        '''
+        Lower cell corner indices and fractional offsets of points of shape (..., 2), clamped to the grid
+        '''
+        u = (np.clip(np.asarray(points, dtype=float), self.lower, self.upper) - self.lower) / self.resolution
+        ij = np.minimum(np.floor(u).astype(int), self.nb_points - 2)
+        return ij[..., 0], ij[..., 1], u[..., 0] - ij[..., 0], u[..., 1] - ij[..., 1]
+
+    def _corners(self, i, j):
+        f = self.field
+        return f[j, i], f[j, i + 1], f[j + 1, i], f[j + 1, i + 1]
+
+    @property
+    def empty(self):
+        return not (self.static_sdf.size or self.dynamic_sdf.size)
+
+    def signed_distance(self, points):
+        '''
+        Bilinearly interpolated signed distance at points of shape (..., 2), inf without obstacles
+        '''
+        if self.empty:
+            return np.full(np.shape(points)[:-1], np.inf)
+        i, j, tx, ty = self._locate(points)
+        f00, f10, f01, f11 = self._corners(i, j)
+        return (1 - ty) * ((1 - tx) * f00 + tx * f10) + ty * ((1 - tx) * f01 + tx * f11)
+
+    def gradient(self, points):
+        '''
+        Gradient of the bilinear interpolant at points of shape (..., 2), returns shape (..., 2)
+        '''
+        if self.empty:
+            return np.zeros(np.shape(points), dtype=float)
+        i, j, tx, ty = self._locate(points)
+        f00, f10, f01, f11 = self._corners(i, j)
+        dx = ((1 - ty) * (f10 - f00) + ty * (f11 - f01)) / self.resolution[0]
+        dy = ((1 - tx) * (f01 - f00) + tx * (f11 - f10)) / self.resolution[1]
+        return np.stack([dx, dy], axis=-1)
+
+    def in_collision(self, points):
+        return self.signed_distance(points) < 0.
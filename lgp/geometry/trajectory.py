@@ -2,25 +2,107 @@ import numpy as np
 from pyrieef.motion.trajectory import Trajectory
 
 
+def linear_interpolation_waypoints(waypoints_list):
+    '''
+    Configurations of K waypoint-interpolated trajectories, built in one pass as a (K, T_max + 2, n) array.
+    Shorter trajectories are padded with their final configuration, the (K, T_max + 2) mask marks valid configurations.
+    Each trajectory matches linear_interpolation_waypoints_trajectory.
+    '''
+    lengths = np.array([waypoints[-1][1] + 2 for waypoints in waypoints_list])
+    n = waypoints_list[0][0][0].size
+    q_init, q_goal, durations, rows = [], [], [], []
+    for k, waypoints in enumerate(waypoints_list):
+        q = np.array([w[0] for w in waypoints], dtype=float).reshape(-1, n)
+        t = np.diff([w[1] for w in waypoints])
+        t[[0, -1] if len(t) else []] += 1  # account for init and goal, only once for a single segment
+        q_init.append(q[:-1])
+        q_goal.append(q[1:])
+        durations.append(t)
+        rows.append(np.full(len(t), k))
+    q_init, q_goal, durations, rows = map(np.concatenate, (q_init, q_goal, durations, rows))
+    segment = np.repeat(np.arange(len(durations)), durations)
+    starts = np.cumsum(durations) - durations
+    alpha = ((np.arange(len(segment)) - starts[segment]) / durations[segment])[:, None]
+    # timestep of each configuration within its own trajectory
+    filled = np.bincount(rows, weights=durations, minlength=len(waypoints_list)).astype(int)
+    row = rows[segment]
+    t = np.arange(len(segment)) - (np.cumsum(filled) - filled)[row]
+    X = np.zeros((len(waypoints_list), lengths.max(), n))
+    X[row, t] = (1 - alpha) * q_init[segment] + alpha * q_goal[segment]
+    mask = np.arange(X.shape[1])[None, :] < lengths[:, None]
+    X[~mask] = np.repeat(X[np.arange(len(lengths)), lengths - 1], X.shape[1] - lengths, axis=0)
+    return X, mask
+
+
+def to_trajectories(X, mask):
+    '''
+    pyrieef trajectories of the valid configurations of a (K, T_max + 2, n) array
+    '''
+    trajectories = []
+    for configs, length in zip(X, mask.sum(axis=1)):
+        trajectory = Trajectory(length - 2, X.shape[2])
+        trajectory.x()[:] = configs[:length].ravel()
+        trajectories.append(trajectory)
+    return trajectories
+
+
+def linear_interpolation_waypoints_trajectories(waypoints_list):
+    return to_trajectories(*linear_interpolation_waypoints(waypoints_list))
+
+
 def linear_interpolation_waypoints_trajectory(waypoints):
-    q, T = waypoints[0][0], waypoints[-1][1]
-    trajectory = Trajectory(T, q.size)
-    t_total = 0
-    for i in range(len(waypoints) - 1):
-        q_init, q_goal, t_segment = waypoints[i][0], waypoints[i + 1][0], waypoints[i + 1][1] - waypoints[i][1]
-        if i == 0 or i == len(waypoints) - 2:  # account for init and goal
-            t_segment += 1
-        for t in range(t_segment):
-            alpha = float(t) / float(t_segment)
-            trajectory.configuration(t + t_total)[:] = (1 - alpha) * q_init + alpha * q_goal
-        t_total += t_segment
-    return trajectory
+    return linear_interpolation_waypoints_trajectories([waypoints])[0]
+
+
+def stack_trajectories(trajectories):
+    '''
+    Stack trajectories of different horizons into a (K, T_max + 2, n) array padded with their final configuration,
+    together with the (K, T_max + 2) mask of valid configurations
+    '''
+    configs = [traj.x().reshape(-1, traj.n()) for traj in trajectories]
+    lengths = np.array([len(c) for c in configs])
+    X = np.empty((len(configs), lengths.max(), configs[0].shape[1]))
+    for k, c in enumerate(configs):
+        X[k, :len(c)] = c
+        X[k, len(c):] = c[-1]
+    mask = np.arange(X.shape[1])[None, :] < lengths[:, None]
+    return X, mask
+
+
+def velocity_norms(X, dt=1., mask=None):
+    '''
+    Velocity norms of (K, T, n) configurations as (K, T - 1), zero on padding
+    '''
+    speed = np.linalg.norm(np.diff(X, axis=-2), axis=-1) / dt
+    return speed if mask is None else speed * mask[..., 1:]
+
+
+def acceleration_norms(X, dt=1., mask=None):
+    '''
+    Acceleration norms of (K, T, n) configurations as (K, T - 2), zero on padding
+    '''
+    acc = np.linalg.norm(np.diff(X, n=2, axis=-2), axis=-1) / dt ** 2
+    return acc if mask is None else acc * mask[..., 2:]
+
+
+def path_lengths(X, mask=None):
+    '''
+    Path lengths of (K, T, n) configurations as (K,), padding does not move so it adds nothing
+    '''
+    return velocity_norms(X, mask=mask).sum(axis=-1)
+
+
+def clearances(X, sdf, mask=None):
+    '''
+    Minimum signed distance along (K, T, 2) configurations as (K,), sdf is an ObstacleSDF or SDFRaster
+    '''
+    d = sdf.signed_distance(X)
+    if mask is not None:
+        d = np.where(mask, d, np.inf)
+    return d.min(axis=-1)
 
 
 def compute_path_length(path):
     if path is None or len(path) <= 1:
         return 0.
-    length = 0.
-    for i in range(len(path) - 1):
-        length += np.linalg.norm(path[i + 1] - path[i])
-    return length
\ No newline at end of file
+    return float(path_lengths(np.asarray(path, dtype=float)))
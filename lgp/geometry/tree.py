@@ -0,0 +1,160 @@
+import logging
+import numpy as np
+import networkx as nx
+
+
+class KinematicTree(nx.DiGraph):
+    '''
+    Kinematic tree of translational links. Parent indices, local offsets and depths are mirrored in NumPy arrays,
+    so global positions are recomputed level by level in vectorized passes, and only for dirty subtrees.
+    The networkx graph itself stays usable for queries and drawing. Link objects must be set with set_link,
+    so that their offsets are tracked.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, incoming_graph_data=None, root='world', dim=2, **attr):
+        self.root = root
+        self.index = {}  # frame -> row
+        self.frames = []
+        self.parent = np.full(0, -1, dtype=int)
+        self.depth = np.full(0, -1, dtype=int)  # -1 for frames detached from the root
+        self.offsets = np.zeros((0, dim))
+        self.positions = np.zeros((0, dim))
+        self.dirty = np.zeros(0, dtype=bool)
+        self.stale = False  # rows must be rebuilt after node removal
+        self.moved = set()  # frames whose offset changed since the last pop_changes
+        self.reparented = set()  # frames re-parented, added or removed since the last pop_changes
+        super(KinematicTree, self).__init__(incoming_graph_data, **attr)
+        if incoming_graph_data is not None:
+            self.stale = True
+
+    def _register(self, frame):
+        if frame in self.index:
+            return self.index[frame]
+        i = len(self.frames)
+        self.index[frame] = i
+        self.frames.append(frame)
+        if i == len(self.parent):  # grow geometrically
+            capacity = max(2 * i, 8)
+            self.parent = np.concatenate([self.parent, np.full(capacity - i, -1, dtype=int)])
+            self.depth = np.concatenate([self.depth, np.full(capacity - i, -1, dtype=int)])
+            self.offsets = np.vstack([self.offsets, np.zeros((capacity - i, self.offsets.shape[1]))])
+            self.positions = np.vstack([self.positions, np.zeros((capacity - i, self.positions.shape[1]))])
+            self.dirty = np.concatenate([self.dirty, np.zeros(capacity - i, dtype=bool)])
+        self.parent[i] = -1
+        self.depth[i] = 0 if frame == self.root else -1
+        self.offsets[i] = 0.
+        self.dirty[i] = True
+        return i
+
+    def _set_subtree_depth(self, frame, depth):
+        self.depth[self.index[frame]] = depth
+        self.dirty[self.index[frame]] = True
+        for child in self.successors(frame):
+            self._set_subtree_depth(child, -1 if depth < 0 else depth + 1)
+
+    def _rebuild(self):
+        frames = list(self.nodes)
+        self.index, self.frames = {}, []
+        self.parent[:] = -1
+        for frame in frames:
+            self._register(frame)
+            link_obj = self.nodes[frame].get('link_obj')
+            if link_obj is not None and frame != self.root:
+                self.offsets[self.index[frame]] = link_obj.origin
+        for u, v in self.edges:
+            self.parent[self.index[v]] = self.index[u]
+        if self.root in self.index:
+            self._set_subtree_depth(self.root, 0)
+        self.stale = False
+
+    def add_node(self, node_for_adding, **attr):
+        if node_for_adding not in self:
+            self.reparented.add(node_for_adding)
+        super(KinematicTree, self).add_node(node_for_adding, **attr)
+        self._register(node_for_adding)
+        if 'link_obj' in attr and node_for_adding != self.root:
+            self.set_offset(node_for_adding, attr['link_obj'].origin)
+
+    def add_edge(self, u_of_edge, v_of_edge, **attr):
+        super(KinematicTree, self).add_edge(u_of_edge, v_of_edge, **attr)
+        u, v = self._register(u_of_edge), self._register(v_of_edge)
+        if self.parent[v] == u and not self.stale:
+            return
+        self.parent[v] = u
+        self.reparented.add(v_of_edge)
+        self._set_subtree_depth(v_of_edge, -1 if self.depth[u] < 0 else self.depth[u] + 1)
+
+    def remove_edge(self, u, v):
+        super(KinematicTree, self).remove_edge(u, v)
+        self.parent[self.index[v]] = -1
+        self.reparented.add(v)
+        self._set_subtree_depth(v, -1)
+
+    def remove_node(self, n):
+        super(KinematicTree, self).remove_node(n)
+        self.reparented.add(n)
+        self.stale = True
+
+    def set_link(self, frame, link_obj):
+        '''
+        Replace the link object of frame, tracking its offset
+        '''
+        self.nodes[frame]['link_obj'] = link_obj
+        self.set_offset(frame, link_obj.origin)
+
+    def set_origin(self, frame, origin):
+        '''
+        Move the link object of frame in place
+        '''
+        link_obj = self.nodes[frame]['link_obj']
+        link_obj.set_origin(origin)
+        self.set_offset(frame, link_obj.origin)
+
+    def set_offset(self, frame, offset):
+        i = self.index[frame]
+        if np.array_equal(self.offsets[i], offset):
+            return
+        self.offsets[i] = offset
+        self.dirty[i] = True
+        self.moved.add(frame)
+
+    def pop_changes(self):
+        '''
+        Frames moved and frames re-parented since the last call
+        '''
+        moved, reparented = self.moved, self.reparented
+        self.moved, self.reparented = set(), set()
+        return moved, reparented
+
+    def update(self):
+        '''
+        Recompute global positions of dirty subtrees, one vectorized pass per depth level
+        '''
+        if self.stale:
+            self._rebuild()
+        n = len(self.frames)
+        depth, parent, dirty = self.depth[:n], self.parent[:n], self.dirty[:n]
+        if not dirty.any():
+            return
+        if self.root in self.index:
+            self.positions[self.index[self.root]] = 0.
+        for d in range(1, depth.max() + 1):
+            level = np.flatnonzero(depth == d)
+            dirty[level] |= dirty[parent[level]]
+            level = level[dirty[level]]
+            self.positions[level] = self.positions[parent[level]] + self.offsets[level]
+        dirty[:] = False
+
+    def get_global_position(self, frame):
+        self.update()
+        return self.positions[self.index[frame]].copy()
+
+    def get_global_positions(self):
+        '''
+        Snapshot dict of the global positions of all frames attached to the root
+        '''
+        self.update()
+        n = len(self.frames)
+        snapshot = self.positions[:n].copy()
+        return {frame: snapshot[i] for i, frame in enumerate(self.frames) if self.depth[i] >= 0}
@@ -1,16 +1,24 @@
+import os
 import logging
+import copy
 import numpy as np
-import pybullet as p
 import networkx as nx
 import matplotlib.pyplot as plt
 import matplotlib
 matplotlib.rcParams['pdf.fonttype'] = 42
 matplotlib.rcParams['ps.fonttype'] = 42
+from os.path import join, exists
 from collections import deque
 from pyrieef.geometry.pixel_map import PixelMap
 from pyrieef.geometry.workspace import Circle, Workspace
 
 from lgp.geometry.kinematics import OBJECT_MAP, EnvBox
+from lgp.geometry.scene import SCENE_MAP
+from lgp.geometry.tree import KinematicTree
+from lgp.geometry.layout import StaticLayout
+from lgp.geometry.region import RegionIndex
+from lgp.geometry.sdf import ObstacleSDF, SDFRaster
+from lgp.utils.trace import traced
 from lgp.geometry.transform import LinearTranslation
 from lgp.utils.helpers import DRAW_MAP, frozenset_of_tuples, draw_trajectory
 
@@ -23,31 +31,55 @@ class LGPWorkspace:
     def __init__(self, **kwargs):
         self.box = kwargs.get('box', EnvBox())
         self.obstacles = kwargs.get('obstacles', {})
+        self.sdf = None
+        self.sdf_key = None
+        self.sdf_raster = None
+
+    def _get_obstacles_key(self):
+        """ Names, shapes and origins of the obstacles, the key changes when
+            obstacles are added, removed, replaced or moved in place """
+        shapes = tuple(self.obstacles.values())
+        return tuple(self.obstacles), shapes, np.array([o.origin for o in shapes], dtype=float)
+
+    def get_sdf(self):
+        """ Signed distance engine over the current obstacles, packed again only when they changed,
+            points are given as a single point (2,) or a stacked meshgrid (2, H, W) """
+        key = self._get_obstacles_key()
+        if self.sdf is None or key[:2] != self.sdf_key[:2] or not np.array_equal(key[2], self.sdf_key[2]):
+            self.sdf, self.sdf_key = ObstacleSDF(self.obstacles), key
+        return self.sdf
+
+    def is_dynamic_obstacle(self, name):
+        return False
+
+    def get_sdf_raster(self, nb_points=100):
+        """ Cached signed distance raster over the workspace box, static obstacles are only
+            rasterized when it is created, set sdf_raster to None when they change """
+        if self.sdf_raster is None or self.sdf_raster.nb_points != nb_points:
+            static = {k: o for k, o in self.obstacles.items() if not self.is_dynamic_obstacle(k)}
+            self.sdf_raster = SDFRaster(self.box, nb_points=nb_points, static=static)
+        dynamic = {k: o for k, o in self.obstacles.items() if self.is_dynamic_obstacle(k)}
+        return self.sdf_raster.update(dynamic)
+
+    @staticmethod
+    def _to_points(pt):
+        pt = np.asarray(pt, dtype=float)
+        return pt if pt.ndim == 1 else np.moveaxis(pt, 0, -1)
 
     def in_collision(self, pt):
-        for k, obst in self.obstacles.items():
-            if obst.dist_from_border(pt) < 0.:
-                return True
-        return False
+        return bool(np.any(self.get_sdf().in_collision(self._to_points(pt))))
 
     def min_dist(self, pt):
-        if len(pt.shape) == 1:
-            d_m = float("inf")
-        else:
-            d_m = np.full((pt.shape[1], pt.shape[2]), np.inf)
-        obj = None
-        for k, obst in self.obstacles.items():
-            d = obst.dist_from_border(pt)
-            closer_to_k = d < d_m
-            d_m = np.where(closer_to_k, d, d_m)
-            obj = np.where(closer_to_k, k, obj)
-        return [d_m.tolist(), obj.tolist()]
+        sdf = self.get_sdf()
+        d_m, i = sdf.closest(self._to_points(pt))
+        names = np.array(sdf.names + [None], dtype=object)
+        return [d_m.tolist(), names[i].tolist() if np.ndim(i) else names[i]]
 
     def min_dist_gradient(self, pt):
         """ Warning: this gradient is ill defined
             it has a kink when two objects are at the same distance """
-        [d_m, obj] = self.min_dist(pt)
-        return self.obstacles[obj].dist_gradient(pt)
+        g = self.get_sdf().gradient(self._to_points(pt))
+        return g if g.ndim == 1 else np.moveaxis(g, -1, 0)
 
     def all_points(self):
         points = []
@@ -81,11 +113,18 @@ class YamlWorkspace(LGPWorkspace):
     def __init__(self, config=None, init_symbol=None, init=True, **kwargs):
         self.robots = {}
         self.humans = {}
+        self._symbolic_state = frozenset()
+        self.symbolic_state_changed = False  # whether the last update_symbolic_state changed the state
+        self.symbolic_diff = (frozenset(), frozenset())  # (added, removed) predicates by the last update_symbolic_state
+        self.symbols_stale = True  # full deduction needed at next update
+        self.frame_predicates = {}  # frame -> 'on' predicates deduced from it
+        self.robot_predicates = {}  # robot frame -> 'at' predicates
         self.kin_tree = self.build_kinematic_tree(config)
         super(YamlWorkspace, self).__init__(box=self.kin_tree.nodes[YamlWorkspace.GLOBAL_FRAME]['link_obj'])
         # init locations
         self.locations = tuple(location for location in self.kin_tree.successors(YamlWorkspace.GLOBAL_FRAME)
                                if not self.kin_tree.nodes[location]['movable'])
+        YamlWorkspace.build_region_indices(self)  # subclasses may index attributes only known once their layout is loaded
         # init geometric & symbolic states
         if init:
             self.update_geometric_state()
@@ -101,11 +140,12 @@ class YamlWorkspace(LGPWorkspace):
                 continue
             if robot_frame in self.robots:
                 self.robots[robot_frame].add_symbol(frozenset_of_tuples([symbol]))
+                self.symbols_stale = True
             else:
                 YamlWorkspace.logger.warn('This symbol %s is not associated with any robot!' % str(symbol))
 
     def build_kinematic_tree(self, config=None):
-        tree = nx.DiGraph()
+        tree = KinematicTree(root=self.GLOBAL_FRAME)
         fringe = deque()
         if config is not None:
             fringe.append(config['tree'])
@@ -139,16 +179,32 @@ class YamlWorkspace(LGPWorkspace):
         for robot in self.robots.values():
             robot.paths.clear()
 
+    def fork(self):
+        '''
+        Copy with its own kinematic tree, link objects, obstacles, robots and geometric state, sharing only the scene
+        and the read-only recordings. Used to plan in the background while this workspace keeps being updated.
+        '''
+        workspace = copy.copy(self)
+        memo = {id(robot.paths): list(robot.paths) for robot in self.robots.values()}  # trajectories are not modified in place
+        workspace.kin_tree = copy.deepcopy(self.kin_tree, memo)  # also copies link objects, sharing origins with their kinematic maps
+        workspace.robots = {frame: copy.deepcopy(robot, memo) for frame, robot in self.robots.items()}
+        workspace.humans = {frame: copy.deepcopy(human, memo) for frame, human in self.humans.items()}
+        workspace.obstacles = {name: memo.get(id(o), o) for name, o in self.obstacles.items()}  # link objects as copied above
+        workspace.sdf_raster = copy.copy(self.sdf_raster)  # shares the static raster
+        workspace._geometric_state = dict(self._geometric_state)
+        workspace.frame_predicates = dict(self.frame_predicates)
+        workspace.robot_predicates = dict(self.robot_predicates)
+        return workspace
+
+    def is_dynamic_obstacle(self, name):
+        return name in self.humans
+
     def get_global_coordinate(self, frame, x=None):
         if frame not in self.kin_tree:
             YamlWorkspace.logger.error('Object %s is not in workspace!' % frame)
             return
-        if x is None:
-            x = np.zeros(self.geometric_state_shape)
-        while frame != YamlWorkspace.GLOBAL_FRAME:
-            x = self.kin_tree.nodes[frame]['link_obj'].kinematic_map.forward(x)
-            frame = list(self.kin_tree.predecessors(frame))[0]
-        return x
+        position = self.kin_tree.get_global_position(frame)
+        return position if x is None else position + x
 
     def get_global_map(self, frame):
         if frame not in self.kin_tree:
@@ -163,46 +219,67 @@ class YamlWorkspace(LGPWorkspace):
         source_local_map = LinearTranslation(target_global_map.backward(self.geometric_state[source_frame]))
         return source_local_map.forward(x)
 
+    def build_region_indices(self):
+        self.location_index = RegionIndex([(loc, self.kin_tree.nodes[loc]['link_obj']) for loc in self.locations], self.box.box_extent())
+
+    def update_region_indices(self, moved, reparented):
+        '''
+        Rebuild the region indices if a location was moved or re-parented, their grid cells are computed from the location bounds
+        '''
+        if any(location in moved or location in reparented for location in self.locations):
+            self.build_region_indices()
+
     def update_symbolic_state(self, init_symbol=None):
         '''
         Update the frozenset of grounded predicates
         NOTE: This function is handcrafted for deducing symbolic state from kinematic tree
         TODO: Extend this function by a more general deduction (could be a research question)
         '''
-        symbolic_state = []
-        fringe = deque()
-        fringe.extend(self.locations)
-        while fringe:
-            frame = fringe.popleft()
-            frame_property = self.kin_tree.nodes[frame]
-            if frame in self.locations:
-                for robot_frame in self.robots:
-                    if frame_property['link_obj'].is_inside(self.geometric_state[robot_frame]):  # this assume locations list
-                        symbolic_state.append(['at', robot_frame, frame])
-            for child in self.kin_tree.successors(frame):
-                child_property = self.kin_tree.nodes[child]
-                if frame in self.locations and child_property['movable'] and frame_property['link_obj'].is_inside(self.geometric_state[child]):
-                    symbolic_state.append(['on', child, frame])
-                fringe.append(child)
-        self._symbolic_state = frozenset_of_tuples(symbolic_state)
-        # get predicates from robot
         if init_symbol is not None:
             self.set_init_robot_symbol(init_symbol)
+        moved, reparented = self.kin_tree.pop_changes()
+        self.update_region_indices(moved, reparented)
+        if self.symbols_stale:
+            self.frame_predicates, self.robot_predicates = {}, {}
+            frames = set(self.kin_tree.nodes)
+            self.symbols_stale = False
+        else:
+            # 'on' depends on the parent location and the position of a frame within it
+            frames = moved.union(reparented)
+            for location in self.locations:
+                if location in moved:
+                    frames.update(self.kin_tree.successors(location))
+        if frames:
+            for robot_frame in self.robots:
+                self.robot_predicates[robot_frame] = frozenset(('at', robot_frame, location) for location in
+                                                               self.location_index.query_all(self.geometric_state[robot_frame]))
+            for frame in frames:
+                parent = next(iter(self.kin_tree.predecessors(frame)), None) if frame in self.kin_tree else None
+                if parent in self.locations and self.kin_tree.nodes[frame]['movable'] and \
+                   self.kin_tree.nodes[parent]['link_obj'].is_inside(self.geometric_state[frame]):
+                    self.frame_predicates[frame] = frozenset([('on', frame, parent)])
+                else:
+                    self.frame_predicates.pop(frame, None)
+        state = frozenset().union(*self.robot_predicates.values(), *self.frame_predicates.values())
+        # get predicates from robot
         for robot in self.robots.values():
-            self._symbolic_state = self._symbolic_state.union(robot.symbolic_state)
+            state = state.union(robot.symbolic_state)
+        self._set_symbolic_state(state)
+
+    def _set_symbolic_state(self, state):
+        '''
+        Set the symbolic state, recording whether it changed and the predicates added & removed
+        '''
+        self.symbolic_diff = (state.difference(self._symbolic_state), self._symbolic_state.difference(state))
+        self.symbolic_state_changed = bool(self.symbolic_diff[0] or self.symbolic_diff[1])
+        if self.symbolic_state_changed:
+            self._symbolic_state = state
 
     def update_geometric_state(self):
         '''
         Update the dict containing objects global coordinates
         '''
-        self._geometric_state = {}
-        fringe = deque()
-        fringe.append(YamlWorkspace.GLOBAL_FRAME)
-        while fringe:
-            frame = fringe.popleft()
-            self._geometric_state[frame] = self.get_global_coordinate(frame)
-            for child in self.kin_tree.successors(frame):
-                fringe.append(child)
+        self._geometric_state = self.kin_tree.get_global_positions()
 
     def draw_workspace(self, show=True):
         self.update_geometric_state()
@@ -268,8 +345,10 @@ class HumoroWorkspace(YamlWorkspace):
         self.robot_model_file = kwargs.get('robot_model_file', 'data/models/cube.urdf')
         self.robot_frame = list(self.robots.keys())[0]   # for now only support one robot
         self.hr = hr
-        self._symbolic_state = frozenset()
-        self.robot_spawned = False
+        self.scene = SCENE_MAP[kwargs.get('scene', 'pybullet')](hr)  # 'numpy' keeps poses in memory without PyBullet
+        self.layout_dir = kwargs.get('layout_dir', None)  # directory of layout snapshots per recording, None to keep them in memory only
+        self.layouts = {}  # recording -> StaticLayout
+        self.landmarks = {}
 
     def set_parameters(self, **kwargs):
         self.segment = kwargs.get('segment')
@@ -283,12 +362,17 @@ class HumoroWorkspace(YamlWorkspace):
         self.duration = int(self.hr.get_segment_timesteps(self.segment) * fraction) + (1 if fraction != 1.0 else 0)
         self.set_robot_geometric_state(self.INIT_ROBOT_POSE)  # reset initial robot pose
         self.constant_symbols = frozenset()
+        self.symbols_stale = True
 
     def set_constant_symbol(self, symbols):
         self.constant_symbols = frozenset_of_tuples(symbols)
+        self.symbols_stale = True
     
     def set_robot_geometric_state(self, state):
-        self.kin_tree.nodes[self.robot_frame]['link_obj'] = OBJECT_MAP['robot'](origin=np.array(state), radius=0.1)
+        if isinstance(self.kin_tree.nodes[self.robot_frame].get('link_obj'), OBJECT_MAP['robot']):
+            self.kin_tree.set_origin(self.robot_frame, state)
+        else:
+            self.kin_tree.set_link(self.robot_frame, OBJECT_MAP['robot'](origin=np.array(state), radius=0.1))
 
     def get_robot_geometric_state(self):
         return self.geometric_state[self.robot_frame]
@@ -304,17 +388,30 @@ class HumoroWorkspace(YamlWorkspace):
             return []
         return self.hr.get_predicates(self.segment, t)
 
+    def is_dynamic_obstacle(self, name):
+        return self.HUMAN_FRAME in name
+
     def get_location(self, x):
-        for loc in self.locations:
-            if self.kin_tree.nodes[loc]['link_obj'].is_inside(x):
-                return loc
-        return 'unknown'
+        return self.location_index.query(x)
 
     def get_area(self, x):
-        for loc in self.locations:
-            if self.kin_tree.nodes[loc]['area'].is_inside(x):
-                return loc
-        return 'unknown'
+        return self.area_index.query(x)
+
+    def get_locations(self, points):
+        '''
+        Batched get_location for points of shape (N, 2)
+        '''
+        return self.location_index.query_batch(points)
+
+    def get_areas(self, points):
+        '''
+        Batched get_area for points of shape (N, 2)
+        '''
+        return self.area_index.query_batch(points)
+
+    def build_region_indices(self):
+        super(HumoroWorkspace, self).build_region_indices()
+        self.area_index = RegionIndex([(loc, self.kin_tree.nodes[loc]['area']) for loc in self.locations], self.box.box_extent())
 
     def clear_workspace(self):
         for n in list(self.kin_tree.nodes()):
@@ -326,61 +423,39 @@ class HumoroWorkspace(YamlWorkspace):
         Initialize workspace using interface from humoro
         '''
         self.set_parameters(**kwargs)
+        self.sdf_raster = None  # static obstacles of the new segment
         global_frame = self.GLOBAL_FRAME
-        self.hr.load_for_playback(self.segment)
-        self.hr.visualize_frame(self.segment, 0)
+        self.scene.load(self.segment)
+        self.scene.show_frame(self.segment, 0)
         self.clear_workspace()
+        layout = self.get_layout()
         # obstables
-        i = 0
-        for obj in self.hr.obstacles:
-            i += 1
-            obj_id = self.hr.p._objects[obj]
-            pos, _ = p.getBasePositionAndOrientation(obj_id)
-            link_obj = OBJECT_MAP['box_obj'](origin=np.array(pos[:2]), dim=np.array([.20, .35]))
-            self.kin_tree.add_node('chair' + str(i), link_obj=link_obj, type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
-            self.kin_tree.add_edge(global_frame, 'chair'+ str(i))
-            self.obstacles['chair' + str(i)] = Circle(origin=np.array(pos[:2]), radius=0.25)
-        # table
-        pos, _ = p.getBasePositionAndOrientation(self.hr.p._objects['table'])
-        link_obj = OBJECT_MAP['box_obj'](origin=np.array(pos[:2]), dim=np.array([.8, .8]))
-        area = Circle(origin=np.array(pos[:2]), radius=1.2)
-        limit = Circle(origin=np.array(pos[:2]), radius=1.0)
-        self.kin_tree.add_node('table', link_obj=link_obj, area=area, limit=limit, type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
-        self.kin_tree.add_edge(global_frame, 'table')
-        self.obstacles['table'] = Circle(origin=np.array(pos[:2]), radius=0.8)
-        # small_shelf
-        pos, _ = p.getBasePositionAndOrientation(self.hr.p._objects['vesken_shelf'])
-        link_obj = OBJECT_MAP['box_obj'](origin=np.array(pos[:2]), dim=np.array([.36, .22]))
-        area = Circle(origin=np.array(pos[:2]), radius=0.75)
-        limit = Circle(origin=np.array(pos[:2]), radius=0.7)
-        self.kin_tree.add_node('small_shelf', link_obj=link_obj, area=area, limit=limit, type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
-        self.kin_tree.add_edge(global_frame, 'small_shelf')
-        self.obstacles['small_shelf'] = Circle(origin=np.array(pos[:2]), radius=0.4)
-        # big_shelf
-        pos, _ = p.getBasePositionAndOrientation(self.hr.p._objects['laiva_shelf'])
-        link_obj = OBJECT_MAP['box_obj'](origin=np.array(pos[:2]), dim=np.array([.24, .59]))
-        area = Circle(origin=np.array(pos[:2]), radius=0.85)
-        limit = Circle(origin=np.array(pos[:2]), radius=0.8)
-        self.kin_tree.add_node('big_shelf', link_obj=link_obj, area=area, limit=limit, type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
-        self.kin_tree.add_edge(global_frame, 'big_shelf')
-        self.obstacles['big_shelf'] = Circle(origin=np.array(pos[:2]), radius=0.5)
+        for i in range(len(layout.chairs)):
+            self.kin_tree.add_node('chair' + str(i + 1), link_obj=layout.get_chair(i), type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
+            self.kin_tree.add_edge(global_frame, 'chair' + str(i + 1))
+            self.obstacles['chair' + str(i + 1)] = layout.get_chair_obstacle(i)
+        # table & shelves
+        for location in layout.locations:
+            self.kin_tree.add_node(location, link_obj=layout.get_location(location), area=layout.get_area(location), limit=layout.get_limit(location),
+                                   type_obj='box_obj', movable=False, color=[1., .5, .25, 1.])
+            self.kin_tree.add_edge(global_frame, location)
+            self.obstacles[location] = layout.get_obstacle(location)
+        self.landmarks = layout.landmarks
         self.locations = set(['table', 'small_shelf', 'big_shelf'])
+        self.build_region_indices()
         self.update_geometric_state()
         # objects
-        for obj in self.objects:
-            if obj in self.hr.p._objects:
-                obj_id = self.hr.p._objects[obj]
-                pos, _ = p.getBasePositionAndOrientation(obj_id)
-                pos = np.array(pos[:2])
-                location = self.get_location(pos)
-                if location != 'unknown':
-                    origin = self.kin_tree.nodes[location]['link_obj'].kinematic_map.backward(pos)
-                    link_obj = OBJECT_MAP['point_obj'](origin=origin)
-                    self.kin_tree.add_edge(location, obj)
-                else:
-                    link_obj = OBJECT_MAP['point_obj'](origin=pos)
-                    self.kin_tree.add_edge(global_frame, obj)
-                self.kin_tree.add_node(obj, link_obj=link_obj, type_obj='point_obj', movable=True, color=[0, 1, 1, 0.9])
+        tracked = [obj for obj in self.objects if self.scene.has_object(obj)]
+        positions = self.scene.get_positions(tracked)[:, :2]
+        for obj, pos, location in zip(tracked, positions, self.get_locations(positions)):
+            if location != 'unknown':
+                origin = self.kin_tree.nodes[location]['link_obj'].kinematic_map.backward(pos)
+                link_obj = OBJECT_MAP['point_obj'](origin=origin)
+                self.kin_tree.add_edge(location, obj)
+            else:
+                link_obj = OBJECT_MAP['point_obj'](origin=pos)
+                self.kin_tree.add_edge(global_frame, obj)
+            self.kin_tree.add_node(obj, link_obj=link_obj, type_obj='point_obj', movable=True, color=[0, 1, 1, 0.9])
         # human
         human_pos = self.hr.get_human_pos_2d(self.segment, 0)
         link_obj = OBJECT_MAP['human'](origin=np.array(human_pos))
@@ -391,62 +466,77 @@ class HumoroWorkspace(YamlWorkspace):
         # init symbolic state
         self.update_symbolic_state()
         # init robot pos
-        if not self.robot_spawned:
-            self.hr.p.spawnRobot(self.robot_frame, urdf=self.robot_model_file)
-            self.robot_spawned = True
-        p.resetBasePositionAndOrientation(self.hr.p._robots[self.robot_frame], [*self.get_robot_geometric_state(), 0], [0, 0, 0, 1])
+        self.scene.spawn_robot(self.robot_frame, self.robot_model_file)
+        self.scene.set_pose(self.robot_frame, [*self.get_robot_geometric_state(), 0])
+
+    def get_layout(self):
+        '''
+        Static layout of the recording of the current segment, read from the scene only once per recording
+        '''
+        recording = self.segment[0]
+        if recording not in self.layouts:
+            filename = join(self.layout_dir, recording + '.npz') if self.layout_dir is not None else None
+            if filename is not None and exists(filename):
+                self.layouts[recording] = StaticLayout.load(filename)
+            else:
+                self.layouts[recording] = StaticLayout.from_scene(self.scene, self.hr.obstacles)
+                if filename is not None:
+                    os.makedirs(self.layout_dir, exist_ok=True)
+                    self.layouts[recording].save(filename)
+        return self.layouts[recording]
 
+    @traced('update_workspace')
     def update_workspace(self, t):
         '''
         Update workspace with human pos and movable objects (for now all are global coordinate)
         '''
         if t < self.duration:
             human_pos = self.hr.get_human_pos_2d(self.segment, t)
-            self.kin_tree.nodes[self.HUMAN_FRAME]['link_obj'] = OBJECT_MAP['human'](origin=np.array(human_pos))
-        for obj in self.objects:
-            if obj in self.hr.p._objects:
-                if self.kin_tree.has_edge(self.robot_frame, obj):  # ignore carrying objects
-                    continue
-                loc = list(self.kin_tree.predecessors(obj))[0]
+            self.kin_tree.set_origin(self.HUMAN_FRAME, human_pos)
+        tracked = [obj for obj in self.objects if self.scene.has_object(obj) and not self.kin_tree.has_edge(self.robot_frame, obj)]  # ignore carrying objects
+        positions = self.scene.get_positions(tracked)[:, :2]
+        for obj, pos, location in zip(tracked, positions, self.get_locations(positions)):
+            loc = next(iter(self.kin_tree.predecessors(obj)))
+            if location != 'unknown':
+                origin = self.kin_tree.nodes[location]['link_obj'].kinematic_map.backward(pos)
+            else:
+                location, origin = self.GLOBAL_FRAME, pos
+            if location != loc:  # re-parent only when the object changed location
                 self.kin_tree.remove_edge(loc, obj)
-                obj_id = self.hr.p._objects[obj]
-                pos, _ = p.getBasePositionAndOrientation(obj_id)
-                pos = np.array(pos[:2])
-                location = self.get_location(pos)
-                if location != 'unknown':
-                    origin = self.kin_tree.nodes[location]['link_obj'].kinematic_map.backward(pos)
-                    link_obj = OBJECT_MAP['point_obj'](origin=origin)
-                    self.kin_tree.add_edge(location, obj)
-                    self.kin_tree.nodes[obj]['link_obj'] = link_obj
-                else:
-                    link_obj = OBJECT_MAP['point_obj'](origin=pos)
-                    self.kin_tree.add_edge(self.GLOBAL_FRAME, obj)
-                    self.kin_tree.nodes[obj]['link_obj'] = link_obj
+                self.kin_tree.add_edge(location, obj)
+            self.kin_tree.set_origin(obj, origin)
         self.update_geometric_state()
 
     def update_symbolic_state(self):
         '''
         Should call update_workspace(t) first.
+        'on' predicates are only deduced again for re-parented objects, robot predicates when the robot moved or anything was re-parented.
         '''
-        preds = []
-        for obj in self.objects:
-            for n in self.kin_tree.predecessors(obj):
-                if n != self.robot_frame and n != self.GLOBAL_FRAME:
-                    preds.append(('on', obj, n))
+        moved, reparented = self.kin_tree.pop_changes()
+        self.update_region_indices(moved, reparented)
+        if self.symbols_stale:
+            self.frame_predicates = {}
+            reparented = set(self.objects)
+            moved = {self.robot_frame}
+            self.symbols_stale = False
+        if self.robot_frame not in moved and not reparented:  # 'on' and 'agent-carry' only change on re-parenting
+            self._set_symbolic_state(self._symbolic_state)
+            return
+        for obj in self.objects.intersection(reparented):
+            self.frame_predicates[obj] = frozenset(('on', obj, n) for n in self.kin_tree.predecessors(obj)
+                                                   if n != self.robot_frame and n != self.GLOBAL_FRAME)
         # deduce agent-carry
-        successors = self.kin_tree.successors(self.robot_frame)
-        agent_preds = [('agent-carry', obj) for obj in successors]
-        if agent_preds:
-            preds.extend(agent_preds)
-        else:
+        preds = [('agent-carry', obj) for obj in self.kin_tree.successors(self.robot_frame)]
+        if not preds:
             preds.append(('agent-free',))
         location = self.get_area(self.get_robot_geometric_state())
         if location != 'unknown':
             preds.append(('agent-at', location))
-        self._symbolic_state = frozenset_of_tuples(preds).union(self.constant_symbols)
+        self.frame_predicates[self.robot_frame] = frozenset(preds)
+        self._set_symbolic_state(frozenset().union(*self.frame_predicates.values()).union(self.constant_symbols))
 
     def visualize_frame(self, t):
-        self.hr.visualize_frame(self.segment, t)
+        self.scene.show_frame(self.segment, t)
 
     @property
     def symbolic_state(self):
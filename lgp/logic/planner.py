@@ -7,6 +7,8 @@ import os
 import sys
 import pickle
 
+from lgp.utils.trace import traced
+
 _path_file = os.path.dirname(os.path.realpath(__file__))
 
 
@@ -40,6 +42,7 @@ class LogicPlanner(object):
         with open(self.cache_name, 'wb') as f:
             pickle.dump({'graph': self.graph, 'goals': self.goal_states}, f)
 
+    @traced('build_graph')
     def build_graph(self):
         '''
         Build LGP graph from PDDL domain and problem
@@ -88,6 +91,7 @@ class LogicPlanner(object):
                 h += 1
         return h
 
+    @traced('plan')
     def plan(self, state=None, alternative=False):
         if self.graph.size() == 0:
             LogicPlanner.logger.warn('LGP graph is not built yet! Plan nothing.')
@@ -0,0 +1,232 @@
+import logging
+import numpy as np
+from bisect import bisect_right
+from itertools import accumulate
+
+
+class PredicateTimeline(object):
+    '''
+    Run-length encoded timeline of grounded predicates over a segment.
+    Each predicate is stored as sorted, disjoint half-open intervals [start, end) of timesteps,
+    so point and window queries reduce to binary searches instead of re-querying predictions.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, duration=0):
+        self.duration = duration
+        self.intervals = {}  # predicate -> (starts, ends)
+
+    @classmethod
+    def from_predicate_function(cls, get_predicates, duration):
+        '''
+        Build the timeline by scanning get_predicates(t) once for t in [0, duration)
+        '''
+        timeline = cls(duration)
+        opened = {}
+        intervals = {}
+        for t in range(duration):
+            current = set(get_predicates(t))
+            for p in current:
+                if p not in opened:
+                    opened[p] = t
+            for p in [p for p in opened if p not in current]:
+                intervals.setdefault(p, []).append((opened.pop(p), t))
+        for p, start in opened.items():
+            intervals.setdefault(p, []).append((start, duration))
+        for p, segments in intervals.items():
+            segments.sort()
+            timeline.intervals[p] = (np.array([s for s, _ in segments], dtype=int),
+                                     np.array([e for _, e in segments], dtype=int))
+        return timeline
+
+    def holds(self, predicate, t):
+        if predicate not in self.intervals:
+            return False
+        starts, ends = self.intervals[predicate]
+        i = np.searchsorted(starts, t, side='right') - 1
+        return i >= 0 and t < ends[i]
+
+    def predicates_at(self, t):
+        '''
+        Equivalent to the predicted predicates at timestep t
+        '''
+        if t < 0 or t >= self.duration:
+            return frozenset()
+        return frozenset(p for p in self.intervals if self.holds(p, t))
+
+    def predicates_in(self, name, t0, t1):
+        '''
+        Predicates with this name holding at any time in [t0, t1], ordered by their first occurrence in the window
+        '''
+        if t1 < t0:
+            return []
+        found = []
+        for p, (starts, ends) in self.intervals.items():
+            if p[0] != name:
+                continue
+            i = np.searchsorted(ends, t0, side='right')  # first interval ending after t0
+            if i < len(starts) and starts[i] <= t1:
+                found.append((max(starts[i], t0), p))
+        found.sort(key=lambda x: x[0])
+        return [p for _, p in found]
+
+    def rising_edges(self, name):
+        '''
+        Timesteps where some predicate with this name starts to hold while none held at the previous timestep
+        '''
+        segments = []
+        for p, (starts, ends) in self.intervals.items():
+            if p[0] == name:
+                segments.extend(zip(starts.tolist(), ends.tolist()))
+        segments.sort()
+        edges = []
+        current_end = -1
+        for start, end in segments:
+            if start > current_end:
+                edges.append(start)
+            current_end = max(current_end, end)
+        return edges
+
+    def to_matrix(self, predicates):
+        '''
+        Boolean predicate-by-time matrix of shape (len(predicates), duration + 1).
+        The last column is always False, standing for any time outside the timeline.
+        '''
+        matrix = np.zeros((len(predicates), self.duration + 1), dtype=bool)
+        for i, p in enumerate(predicates):
+            if p in self.intervals:
+                for start, end in zip(*self.intervals[p]):
+                    matrix[i, start:end] = True
+        return matrix
+
+
+class TemporalPlanVerifier(object):
+    '''
+    Batched verification of durative action skeletons against a predicate timeline.
+    Start and end preconditions of all candidate plans are gathered into flat index arrays
+    and evaluated with a single lookup into the predicate-by-time matrix.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, timeline, verify_predicates):
+        self.timeline = timeline
+        self.verify_predicates = verify_predicates
+        self.predicates = list(timeline.intervals.keys())
+        self.index = {p: i for i, p in enumerate(self.predicates)}
+        self.never = len(self.predicates)  # row for predicates never predicted
+        self.matrix = np.vstack([timeline.to_matrix(self.predicates), np.zeros((1, timeline.duration + 1), dtype=bool)])
+        self._checks = {}
+
+    def _encode(self, positive, negative):
+        rows, expected = [], []
+        for p in positive:
+            rows.append(self.index.get(p, self.never))
+            expected.append(True)
+        for p in negative:
+            if p in self.index:  # never predicted predicates trivially satisfy negative preconditions
+                rows.append(self.index[p])
+                expected.append(False)
+        return np.array(rows, dtype=int), np.array(expected, dtype=bool)
+
+    def _get_checks(self, action):
+        '''
+        Cached (start_rows, start_expected, end_rows, end_expected) of an action, None if it does not need verifying
+        '''
+        key = id(action)
+        if key not in self._checks:
+            verifying = any(p[0] in self.verify_predicates for p in action.positive_preconditions.union(action.negative_preconditions))
+            if verifying:
+                self._checks[key] = (*self._encode(action.start_positive_preconditions, action.start_negative_preconditions),
+                                     *self._encode(action.end_positive_preconditions, action.end_negative_preconditions))
+            else:
+                self._checks[key] = None
+        return self._checks[key]
+
+    def verify(self, plans, t, elapsed_t, ratio, window_len):
+        '''
+        Return a boolean array telling which plans satisfy their start & end preconditions within the window.
+        The first currently executing action skips its start check, actions ending outside the window are not verified.
+        '''
+        if not plans:
+            return np.zeros(0, dtype=bool)
+        lengths = np.array([len(plan[1]) for plan in plans], dtype=int)
+        actions = [a for plan in plans for a in plan[1]]
+        durations = np.array([a.duration for a in actions], dtype=int)
+        plan_ids = np.repeat(np.arange(len(plans)), lengths)
+        cum = np.cumsum(durations)
+        plan_offsets = np.cumsum(lengths) - lengths
+        base = np.zeros(len(plans), dtype=int)
+        nonempty = lengths > 0
+        base[nonempty] = (cum - durations)[plan_offsets[nonempty]]
+        ends = cum - base[plan_ids] - elapsed_t
+        starts = ends - durations
+        candidates = np.flatnonzero((ends > 0) & (ends <= window_len))
+        check_plans, check_times, check_rows, check_expected = [], [], [], []
+        for k in candidates:
+            checks = self._get_checks(actions[k])
+            if checks is None:
+                continue
+            start_rows, start_expected, end_rows, end_expected = checks
+            if starts[k] >= 0:
+                check_plans.append(np.full(len(start_rows), plan_ids[k]))
+                check_times.append(np.full(len(start_rows), t + starts[k] * ratio))
+                check_rows.append(start_rows)
+                check_expected.append(start_expected)
+            check_plans.append(np.full(len(end_rows), plan_ids[k]))
+            check_times.append(np.full(len(end_rows), t + ends[k] * ratio))
+            check_rows.append(end_rows)
+            check_expected.append(end_expected)
+        if not check_rows:
+            return np.ones(len(plans), dtype=bool)
+        check_plans = np.concatenate(check_plans).astype(int)
+        check_times = np.clip(np.concatenate(check_times).astype(int), 0, self.timeline.duration)
+        failed = self.matrix[np.concatenate(check_rows), check_times] != np.concatenate(check_expected)
+        return np.bincount(check_plans[failed], minlength=len(plans)) == 0
+
+
+class PlanIndex(object):
+    '''
+    Prefix sums of the action durations of a plan skeleton, together with the index of the next move action from each action,
+    so time queries on the plan become binary searches instead of walks from its first action.
+    '''
+
+    def __init__(self, actions):
+        self.actions = actions
+        self.ends = list(accumulate(a.duration for a in actions))  # end time of each action
+        self.total = self.ends[-1] if self.ends else 0
+        n = len(actions)
+        self.next_move = [n] * (n + 1)  # index of the first move action at or after each action, n if none
+        for k in range(n - 1, -1, -1):
+            self.next_move[k] = k if actions[k].name == 'move' else self.next_move[k + 1]
+
+    def action_index(self, t):
+        '''
+        Index of the first action not finished at elapsed time t
+        '''
+        return bisect_right(self.ends, t)
+
+    def action_at(self, t):
+        k = self.action_index(t)
+        return self.actions[k] if k < len(self.actions) else None
+
+    def has_move_after(self, t=None):
+        k = 0 if t is None else self.action_index(t)
+        return self.next_move[k] < len(self.actions)
+
+    def next_move_at(self, t):
+        '''
+        Next move action not finished at elapsed time t and its end time relative to t, (None, remaining time) if none
+        '''
+        k = self.next_move[self.action_index(t)]
+        if k < len(self.actions):
+            return self.actions[k], self.ends[k] - t
+        return None, self.total - t
+
+    def moves_after(self, t):
+        '''
+        Indices of the move actions not finished at elapsed time t
+        '''
+        k = self.next_move[self.action_index(t)]
+        while k < len(self.actions):
+            yield k
+            k = self.next_move[k + 1]
@@ -0,0 +1,35 @@
+import logging
+import numpy as np
+
+
+class InfeasibilityCache(object):
+    '''
+    Memory of candidate skeletons whose trajectory optimization failed, keyed by their move target sequence
+    and a quantized fingerprint of the human obstacles. Entries expire after ttl timesteps as the human moves on.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, ttl, resolution=0.25):
+        self.ttl = ttl
+        self.resolution = resolution
+        self.entries = {}  # key -> timestep of last failure
+
+    def fingerprint(self, obstacles):
+        '''
+        Origins and radii of the obstacles rounded to the nearest multiple of resolution, so configurations whose
+        obstacles all round to the same grid cells and radii share a fingerprint
+        '''
+        return frozenset((*np.round(np.asarray(o.origin) / self.resolution).astype(int).tolist(), int(round(o.radius / self.resolution)))
+                         for o in obstacles)
+
+    def expire(self, t):
+        self.entries = {k: v for k, v in self.entries.items() if t - v <= self.ttl}
+
+    def add(self, key, t):
+        self.entries[key] = t
+
+    def clear(self):
+        self.entries.clear()
+
+    def __contains__(self, key):
+        return key in self.entries
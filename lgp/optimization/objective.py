@@ -1,8 +1,11 @@
 import logging
+import time
 import numpy as np
 
 from pyrieef.geometry.workspace import Circle, Box, Workspace
 
+from lgp.geometry.sdf import ObstacleSDF
+
 
 # temporary importing until complication of install is resolve
 import os
@@ -17,6 +20,8 @@ class TrajectoryConstraintObjective:
     logger = logging.getLogger(__name__)
 
     def __init__(self, **kwargs):
+        self.kwargs = kwargs
+        self.problem_kwargs = {}
         self.verbose = kwargs.get('verbose', False)
         self.T = kwargs.get('T', 0)   # time steps
         self.dt = kwargs.get('dt', 0.1)  # sample rate
@@ -24,6 +29,8 @@ class TrajectoryConstraintObjective:
         # set parameters
         self.set_parameters(**kwargs)
         self.objective = None
+        self.num_obstacles = 0
+        self.optimize_time = 0.
         # ipopt options
         self.ipopt_options = {
             'tol': kwargs.get('tol', 9e-3),
@@ -40,6 +47,7 @@ class TrajectoryConstraintObjective:
 
     def set_parameters(self, **kwargs):
         self.workspace = kwargs.get('workspace', None)
+        self.obstacles = kwargs.get('obstacles', [])  # candidate specific obstacles added on top of the workspace ones
         self.trajectory = kwargs.get('trajectory', None)
         if self.trajectory is not None:
             self._q_init = self.trajectory.initial_configuration()
@@ -65,19 +73,25 @@ class TrajectoryConstraintObjective:
 
     def set_problem(self, **kwargs):
         self.set_parameters(**kwargs)
+        self.problem_kwargs = kwargs
         if self.workspace is None:
             TrajectoryConstraintObjective.logger.error('Workspace is not defined! Cannot set optimization problem.')
             return
         if self.trajectory is None:
             TrajectoryConstraintObjective.logger.error('Init trajectory is not defined! Cannot set optimization problem.')
             return
+        if not kwargs.get('build', True):  # parameters only, the problem is built by an optimizer worker
+            return
         self.problem = PlanarOptimizer(self.T, self.dt, self.workspace.box.box_extent())
         # Add workspace obstacles
-        for o in self.workspace.obstacles:
+        self.num_obstacles = 0
+        for o in list(self.workspace.obstacles) + list(self.obstacles):
             if isinstance(o, Circle):
                 self.problem.add_sphere(o.origin, o.radius)
+                self.num_obstacles += 1
             elif isinstance(o, Box):
                 self.problem.add_box(o.origin, o.dim)
+                self.num_obstacles += 1
             else:
                 TrajectoryConstraintObjective.logger.warn('Shape {} not supported by bewego'.format(type(o)))
         # terms
@@ -133,20 +147,52 @@ class TrajectoryConstraintObjective:
     def optimize(self, status=None, traj=None, ipopt_options=None):
         if ipopt_options is None:
             ipopt_options = self.ipopt_options
+        start = time.time()
         res = self.problem.optimize(
             self.trajectory.x(),
             self.q_goal,
             ipopt_options
         )
+        self.optimize_time = time.time() - start
         self.trajectory.active_segment()[:] = res.x
         if self.verbose:
             TrajectoryConstraintObjective.logger.info('Gradient norm : %f' % np.linalg.norm(res.jac))
+            TrajectoryConstraintObjective.logger.info('Obstacles: %d, optimize time: %f s' % (self.num_obstacles, self.optimize_time))
         if status is not None:  # get out status from multiprocessing
             status.value = res.success
         if traj is not None:
             traj[:] = self.trajectory.x().tolist()
         return res.success, self.trajectory
 
+    def is_feasible(self, trajectory=None, tol=None):
+        '''
+        Check the problem constraints on a trajectory, e.g. the last iterate of a solve stopped at its time limit:
+        goal and waypoints reached within tol and obstacle clearance of at least the obstacle margin
+        '''
+        if trajectory is None:
+            trajectory = self.trajectory
+        if tol is None:
+            tol = self.ipopt_options['constr_viol_tol']
+        configs = trajectory.x().reshape(-1, self.n)
+        violations = []
+        if self.s_terminal_potential > 0 and self.with_goal_constraint:
+            if self.with_goal_manifold:
+                violations.append(np.linalg.norm(configs[-1] - self.goal_manifold.origin) - self.goal_manifold.radius)
+            else:
+                violations.append(np.linalg.norm(configs[-1] - self.q_goal))
+        if self.s_waypoint_constraint > 0:
+            if self.waypoints is not None:
+                if self.with_waypoint_constraint:
+                    for q, t in self.waypoints[1:-1]:
+                        violations.append(np.linalg.norm(configs[t] - q))
+            elif self.waypoint_manifolds is not None:
+                for manifold, t in self.waypoint_manifolds[:-1]:
+                    violations.append(np.linalg.norm(configs[t] - manifold.origin) - manifold.radius)
+        if self.s_obstacle_constraint > 0:
+            clearance = ObstacleSDF(list(self.workspace.obstacles) + list(self.obstacles)).signed_distance(configs[1:]).min()
+            violations.append(self.s_obstacle_margin - clearance)
+        return max(violations, default=0.) <= tol
+
     @property
     def q_init(self):
         return self._q_init
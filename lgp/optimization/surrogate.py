@@ -0,0 +1,52 @@
+import logging
+import numpy as np
+
+from lgp.geometry.sdf import ObstacleSDF
+from lgp.geometry.trajectory import stack_trajectories, velocity_norms, acceleration_norms
+from lgp.optimization.objective import TrajectoryConstraintObjective
+
+
+class SurrogateCost:
+    '''
+    Pure NumPy approximation of the smoothness and obstacle terms of TrajectoryConstraintObjective.
+    It scores a batch of initial trajectories at once, so candidates can be ranked without building an optimizer for each.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, objective=None, **kwargs):
+        '''
+        Weights are read from the approximated objective, which is built from kwargs if not given
+        '''
+        if objective is None:
+            objective = TrajectoryConstraintObjective(**kwargs)
+        self.dt = objective.dt
+        self.s_velocity_norm = objective.s_velocity_norm
+        self.s_acceleration_norm = objective.s_acceleration_norm
+        self.s_obstacles = objective.s_obstacles
+        self.s_obstacle_alpha = objective.s_obstacle_alpha
+        self.s_obstacle_margin = objective.s_obstacle_margin
+        self.set_obstacles(kwargs.get('obstacles', []))
+
+    def set_obstacles(self, obstacles):
+        self.sdf = ObstacleSDF(obstacles)
+
+    def signed_distance(self, points):
+        '''
+        Minimum signed distance to all obstacles, points has shape (..., 2)
+        '''
+        return self.sdf.signed_distance(points)
+
+    def costs(self, trajectories):
+        '''
+        Surrogate costs of a list of pyrieef trajectories, as a (K,) array
+        '''
+        X, mask = stack_trajectories(trajectories)
+        speed = velocity_norms(X, self.dt, mask)
+        acc_norm = acceleration_norms(X, self.dt, mask)
+        cost = self.s_velocity_norm * (speed ** 2).sum(axis=1) * self.dt
+        cost += self.s_acceleration_norm * (acc_norm ** 2).sum(axis=1) * self.dt
+        if self.s_obstacles > 0 and self.sdf.size:
+            d = self.signed_distance(X[:, :-1])
+            potential = np.exp(-self.s_obstacle_alpha * (d - self.s_obstacle_margin))
+            cost += self.s_obstacles * (potential * speed).sum(axis=1) * self.dt
+        return cost
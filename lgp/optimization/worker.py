@@ -0,0 +1,115 @@
+import logging
+import atexit
+import traceback
+import numpy as np
+from queue import Empty
+from multiprocessing import Process, Queue
+from multiprocessing import shared_memory
+
+from lgp.optimization.objective import TrajectoryConstraintObjective
+
+from pyrieef.geometry.workspace import Workspace
+from pyrieef.motion.trajectory import Trajectory
+
+
+class OptimizerWorker(object):
+    '''
+    Long-lived process solving trajectory optimization jobs from a queue.
+    The static scene (workspace box and static obstacles) is sent once with set_scene, a job then only carries the candidate
+    parameters (waypoints, goal manifold and candidate obstacles such as humans). PlanarOptimizer cannot be pickled, so the worker builds it.
+    Trajectories are passed both ways through a reusable shared memory buffer, which is only reallocated when a job outgrows it.
+    '''
+    logger = logging.getLogger(__name__)
+    SCENE_KWARGS = ('workspace', 'trajectory', 'build')  # problem parameters not sent with a job
+
+    def __init__(self, capacity=1024, poll=0.5):
+        self.poll = poll  # seconds between liveness checks while waiting for a result
+        self.jobs = Queue()
+        self.results = Queue()
+        self.buffer = shared_memory.SharedMemory(create=True, size=capacity * np.dtype(np.float64).itemsize)
+        self.capacity = capacity
+        self.process = Process(target=OptimizerWorker._serve, args=(self.jobs, self.results), daemon=True)
+        self.process.start()
+        atexit.register(self.close)
+
+    def set_scene(self, box, obstacles):
+        '''
+        Send the static scene used by the next jobs, e.g. once per segment
+        '''
+        self.jobs.put(('scene', box, list(obstacles)))
+
+    def submit(self, objective, ipopt_options=None):
+        '''
+        Queue the optimization of objective, which should have called set_problem (with build=False)
+        on a workspace holding the static scene, the candidate obstacles are given as obstacles
+        '''
+        x = objective.trajectory.x()
+        if x.size > self.capacity:
+            self.buffer.close()
+            self.buffer.unlink()
+            self.capacity = max(x.size, 2 * self.capacity)
+            self.buffer = shared_memory.SharedMemory(create=True, size=self.capacity * np.dtype(np.float64).itemsize)
+        np.ndarray(x.shape, dtype=np.float64, buffer=self.buffer.buf)[:] = x
+        problem_kwargs = {k: v for k, v in objective.problem_kwargs.items() if k not in OptimizerWorker.SCENE_KWARGS}
+        self.jobs.put(('solve', objective.kwargs, problem_kwargs, x.size, objective.n, ipopt_options, self.buffer.name))
+
+    def result(self):
+        '''
+        Block until the submitted job finishes, return (success, trajectory), or (False, None) if the job failed or the worker died
+        '''
+        while True:
+            try:
+                success, size, n = self.results.get(timeout=self.poll)
+                break
+            except Empty:
+                if not self.process.is_alive() and self.results.empty():
+                    OptimizerWorker.logger.error(f'Optimizer worker died with exit code {self.process.exitcode}.')
+                    return False, None
+        if size == 0:
+            return False, None
+        x = np.array(np.ndarray((size,), dtype=np.float64, buffer=self.buffer.buf))  # copy out before the buffer is reused
+        return success, Trajectory(q_init=x[:n], x=x[n:])
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.jobs.put(None)
+            self.process.join()
+        self.process = None
+        self.buffer.close()
+        self.buffer.unlink()
+
+    @staticmethod
+    def _serve(jobs, results):
+        buffers, scene = {}, None
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            if job[0] == 'scene':
+                _, box, obstacles = job
+                scene = Workspace(box=box)
+                scene.obstacles = obstacles
+                continue
+            _, kwargs, problem_kwargs, size, n, ipopt_options, name = job
+            try:
+                if scene is None:
+                    raise RuntimeError('No scene set before the first job.')
+                if name not in buffers:
+                    for b in buffers.values():
+                        b.close()
+                    buffers = {name: shared_memory.SharedMemory(name=name)}
+                x = np.array(np.ndarray((size,), dtype=np.float64, buffer=buffers[name].buf))
+                objective = TrajectoryConstraintObjective(**kwargs)
+                objective.set_problem(workspace=scene, trajectory=Trajectory(q_init=x[:n], x=x[n:]), **problem_kwargs)
+                success, traj = objective.optimize(ipopt_options=ipopt_options)
+                x = traj.x()
+                np.ndarray(x.shape, dtype=np.float64, buffer=buffers[name].buf)[:] = x
+            except Exception:
+                OptimizerWorker.logger.error('Optimization job failed:\n' + traceback.format_exc())
+                results.put((False, 0, 0))
+                continue
+            results.put((bool(success), x.size, objective.n))
+        for b in buffers.values():
+            b.close()
@@ -0,0 +1,69 @@
+import logging
+import os
+import numpy as np
+import pybullet as p
+from queue import Queue, Full
+from threading import Thread
+from matplotlib.image import imsave
+
+
+class FrameWriter(object):
+    '''
+    Asynchronous frame capture from the PyBullet camera.
+    Only rendering happens in the control loop, raw buffers are handed to a bounded queue and PNG encoding & disk writes
+    are done by writer threads. When the queue is full, capture either blocks (backpressure) or drops the frame.
+A failing write does not stop its writer, which keeps draining the queue, the first error is re-raised by close.
+    '''
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, image_dir, **kwargs):
+        self.image_dir = image_dir
+        self.decimation = kwargs.get('decimation', 1)  # capture one frame every decimation timesteps
+        self.drop = kwargs.get('drop', False)  # drop frames instead of blocking when writers fall behind
+        self.resolution = kwargs.get('resolution', None)  # (width, height), defaults to debug visualizer size
+        self.queue = Queue(maxsize=kwargs.get('queue_size', 32))
+        self.num_dropped = 0
+        self.errors = []  # exceptions raised by the writers
+        self.writers = [Thread(target=FrameWriter._serve, args=(self.queue, self.errors), daemon=True)
+                        for _ in range(kwargs.get('num_writers', 2))]
+        for w in self.writers:
+            w.start()
+
+    def capture(self, t):
+        if t % self.decimation != 0:
+            return
+        width, height, view, projection = p.getDebugVisualizerCamera()[:4]
+        if self.resolution is not None:
+            width, height = self.resolution
+        img = p.getCameraImage(width, height, view, projection, renderer=p.ER_BULLET_HARDWARE_OPENGL)[2]
+        rgba = np.array(img, dtype=np.uint8).reshape(height, width, 4)
+        fn = os.path.join(self.image_dir, str(t) + '.png')
+        try:
+            self.queue.put((fn, rgba), block=not self.drop)
+        except Full:
+            self.num_dropped += 1
+
+    def close(self):
+        '''
+        Wait until all queued frames are written, re-raise the first write error if any
+        '''
+        for _ in self.writers:
+            self.queue.put(None)
+        for w in self.writers:
+            w.join()
+        if self.num_dropped:
+            FrameWriter.logger.warn(f'Dropped {self.num_dropped} frames.')
+        if self.errors:
+            FrameWriter.logger.error(f'{len(self.errors)} frames failed to be written.')
+            raise self.errors[0]
+
+    @staticmethod
+    def _serve(queue, errors):
+        while True:
+            frame = queue.get()
+            if frame is None:
+                break
+            try:
+                imsave(*frame)
+            except Exception as e:
+                errors.append(e)
@@ -0,0 +1,80 @@
+import numpy as np
+from collections.abc import Mapping
+
+
+class ArrayRecorder(object):
+    '''
+    Append-only typed array, preallocated and grown geometrically.
+    view() returns the recorded rows without copying.
+    '''
+
+    def __init__(self, shape=(), capacity=16, dtype=float):
+        self.data = np.empty((max(capacity, 1), *shape), dtype=dtype)
+        self.size = 0
+
+    def reserve(self, capacity):
+        if capacity > len(self.data):
+            data = np.empty((capacity, *self.data.shape[1:]), dtype=self.data.dtype)
+            data[:self.size] = self.data[:self.size]
+            self.data = data
+
+    def append(self, value):
+        if self.size == len(self.data):
+            self.reserve(2 * len(self.data))
+        self.data[self.size] = value
+        self.size += 1
+
+    def view(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+
+class TimeSeries(Mapping):
+    '''
+    Read-only mapping from increasing timesteps to values, backed by arrays
+    '''
+
+    def __init__(self, keys, values):
+        self.keys_ = keys
+        self.values_ = values
+
+    def __getitem__(self, t):
+        i = np.searchsorted(self.keys_, t)
+        if i == len(self.keys_) or self.keys_[i] != t:
+            raise KeyError(t)
+        return self.values_[i]
+
+    def __iter__(self):
+        return iter(self.keys_.tolist())
+
+    def __len__(self):
+        return len(self.keys_)
+
+
+class SeriesRecorder(object):
+    '''
+    Per-trigger metric recorded at increasing timesteps, recording twice at the same timestep overwrites the value
+    '''
+
+    def __init__(self, capacity=16, dtype=float):
+        self.keys = ArrayRecorder(capacity=capacity, dtype=int)
+        self.values = ArrayRecorder(capacity=capacity, dtype=dtype)
+
+    def reserve(self, capacity):
+        self.keys.reserve(capacity)
+        self.values.reserve(capacity)
+
+    def record(self, t, value):
+        if self.keys.size and self.keys.data[self.keys.size - 1] == t:
+            self.values.data[self.values.size - 1] = value
+            return
+        self.keys.append(t)
+        self.values.append(value)
+
+    def view(self):
+        return TimeSeries(self.keys.view(), self.values.view())
+
+    def __len__(self):
+        return len(self.keys)
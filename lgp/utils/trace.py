@@ -0,0 +1,90 @@
+import os
+import json
+import time
+import threading
+from functools import wraps
+
+
+class Span(object):
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.tracer.events.append({
+            'name': self.name,
+            'cat': 'lgp',
+            'ph': 'X',  # complete event, nested by time on the same thread
+            'ts': (self.start - self.tracer.origin) * 1e6,
+            'dur': (end - self.start) * 1e6,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.args
+        })
+        return False
+
+
+class NullSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Tracer(object):
+    '''
+    Collects nested timing spans of the planning phases, exported in Chrome trace format (also read by Perfetto).
+    When disabled, span() returns a shared no-op context manager.
+    '''
+
+    def __init__(self):
+        self.enabled = False
+        self.events = []
+        self.origin = time.perf_counter()
+        self._null = NullSpan()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        self.events = []
+        self.origin = time.perf_counter()
+
+    def span(self, name, **args):
+        if not self.enabled:
+            return self._null
+        return Span(self, name, args)
+
+    def export(self, filename):
+        with open(filename, 'w') as f:
+            json.dump({'traceEvents': self.events, 'displayTimeUnit': 'ms'}, f)
+
+
+TRACER = Tracer()
+
+
+def traced(name=None):
+    '''
+    Decorator wrapping each call of a function in a span of the global tracer
+    '''
+    def decorator(f):
+        label = name or f.__qualname__
+
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if not TRACER.enabled:
+                return f(*args, **kwargs)
+            with TRACER.span(label):
+                return f(*args, **kwargs)
+        return wrapper
+    return decorator